@@ -2,6 +2,8 @@
 QA API endpoints
 """
 
+from functools import lru_cache
+
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.responses import StreamingResponse
 from app.schemas.qa import QARequest, QAResponse
@@ -10,10 +12,12 @@ from app.services.qa_service import QAService
 router = APIRouter(prefix="/api/qa", tags=["QA"])
 
 
+@lru_cache()
 def get_qa_service() -> QAService:
     """
     Dependency injection for QA service
-    Lazy initialization to avoid collection not found error
+    Lazy initialization to avoid collection not found error; built on first
+    request and then shared (retriever, LLM and caches are reused)
     """
     return QAService()
 
@@ -2,10 +2,12 @@
 API routes for safety analysis
 """
 
+import orjson
 from fastapi import APIRouter, UploadFile, File, Depends, Form
-from typing import Annotated, Optional
+from fastapi.responses import StreamingResponse
+from typing import Annotated, AsyncIterator, List, Optional
 
-from app.schemas.safety import SafetyReport
+from app.schemas.safety import SafetyReport, SafetyViolation
 from app.services.analysis_service import AnalysisService
 from app.core.deps import get_analysis_service
 
@@ -18,6 +20,10 @@ async def analyze_image(
     user_hazards: Annotated[
         Optional[str], Form(description="User-provided hazard description")
     ] = None,
+    prefetch_hazards: Annotated[
+        Optional[str],
+        Form(description="Hazards expected in this image, one per line"),
+    ] = None,
     service: AnalysisService = Depends(get_analysis_service),
 ):
     """
@@ -27,13 +33,72 @@ async def analyze_image(
     - **user_hazards**: Optional user-provided hazard description (single text)
       (e.g., "高空作业时，工人未佩戴安全帽")
       If empty or not provided, only VLM-detected hazards will be used.
+    - **prefetch_hazards**: Optional hazards expected in this image, one per
+      line (e.g. the previous video frame's). Their regulations are
+      retrieved while the VLM runs; they are not added to the report.
 
     Returns a safety report with detected violations and recommendations.
     User-provided hazard will be combined with VLM-detected hazards.
     """
-    # Parse user_hazards: treat entire string as one hazard
-    user_hazards_list = None
+    return await service.analyze_image(
+        file,
+        user_hazards=_parse_user_hazards(user_hazards),
+        prefetch_hazards=_parse_prefetch_hazards(prefetch_hazards),
+    )
+
+
+@router.post("/image/stream")
+async def analyze_image_stream(
+    file: Annotated[UploadFile, File(description="Image file to analyze")],
+    user_hazards: Annotated[
+        Optional[str], Form(description="User-provided hazard description")
+    ] = None,
+    prefetch_hazards: Annotated[
+        Optional[str],
+        Form(description="Hazards expected in this image, one per line"),
+    ] = None,
+    service: AnalysisService = Depends(get_analysis_service),
+):
+    """
+    Analyze an image like /analysis/image, streaming violations via SSE
+
+    Each relevant violation is sent as soon as it is generated
+    (`data: <SafetyViolation JSON>`), followed by `event: done`. Failures
+    after streaming started are sent as `event: error`.
+    """
+    violations = await service.analyze_image_stream(
+        file,
+        user_hazards=_parse_user_hazards(user_hazards),
+        prefetch_hazards=_parse_prefetch_hazards(prefetch_hazards),
+    )
+    return StreamingResponse(
+        _violation_events(violations), media_type="text/event-stream"
+    )
+
+
+def _parse_user_hazards(user_hazards: Optional[str]) -> Optional[List[str]]:
+    """Parse user_hazards: treat entire string as one hazard"""
     if user_hazards and user_hazards.strip():
-        user_hazards_list = [user_hazards.strip()]
+        return [user_hazards.strip()]
+    return None
+
+
+def _parse_prefetch_hazards(prefetch_hazards: Optional[str]) -> Optional[List[str]]:
+    """Parse prefetch_hazards: one hazard per non-empty line"""
+    if not prefetch_hazards:
+        return None
+    return [line.strip() for line in prefetch_hazards.splitlines() if line.strip()]
+
 
-    return await service.analyze_image(file, user_hazards=user_hazards_list)
+async def _violation_events(
+    violations: AsyncIterator[SafetyViolation],
+) -> AsyncIterator[str]:
+    """Format violations as Server-Sent Events"""
+    try:
+        async for violation in violations:
+            yield f"data: {violation.model_dump_json()}\n\n"
+    except Exception as e:
+        payload = orjson.dumps({"detail": getattr(e, "detail", str(e))})
+        yield f"event: error\ndata: {payload.decode()}\n\n"
+        return
+    yield "event: done\ndata: {}\n\n"
@@ -35,7 +35,7 @@ async def upload_documents(
     """
     details = await service.upload_documents(files, skip_existing, purpose)
 
-    success_count = sum(1 for d in details if d.status == "success")
+    success_count = sum(d.status == "success" for d in details)
     return DocumentUploadResponse(
         success=success_count == len(files),
         message=f"Processed {len(files)} files, {success_count} succeeded",
@@ -74,7 +74,7 @@ async def list_documents(
     settings = get_settings()
     if page_size is None:
         page_size = settings.documents_default_page_size
-    return service.list_documents_paginated(purpose, page, page_size, search)
+    return await service.list_documents_paginated(purpose, page, page_size, search)
 
 
 @router.delete("")
@@ -92,5 +92,5 @@ async def delete_documents(
     - **qa**: Deletes from qa collection
     - **safety**: Deletes from regulations + hazard_db collections
     """
-    results = service.delete_documents(filenames, purpose)
+    results = await service.delete_documents(filenames, purpose)
     return {"success": True, "results": results}
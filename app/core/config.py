@@ -2,8 +2,8 @@
 Application configuration using Pydantic Settings
 """
 
+from functools import cached_property
 from pydantic_settings import BaseSettings
-from functools import lru_cache
 from typing import List
 
 
@@ -27,11 +27,25 @@ class Settings(BaseSettings):
     # Qdrant Settings
     qdrant_host: str = "qdrant-server"
     qdrant_port: int = 6333
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = True  # Use gRPC transport for upserts and searches
+
+    # HNSW Index Settings (applied when collections are created)
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 200
+    qdrant_indexing_threshold: int = 20000
+    qdrant_default_segment_number: int = 2
+    qdrant_warmup_queries: int = 3  # Warm-up queries per collection at startup
+
+    # Vector Quantization Settings (applied when collections are created)
+    qdrant_quantization: str = "int8"  # 'int8' (scalar), 'binary' or 'none'
+    qdrant_quantization_oversampling: float = 2.0  # Candidates rescored per result
 
     # Multiple Collection Names for different document types
     qdrant_collection_regulations: str = "rag-regulations"  # PDF/Markdown/Word
     qdrant_collection_hazard_db: str = "rag-hazard-db"  # Excel files
     qdrant_collection_qa: str = "rag-qa-knowledge"  # QA system knowledge base
+    qdrant_collection_query_cache: str = "rag-query-cache"  # Persistent query cache
 
     # Excel Processing Settings
     excel_rows_per_chunk: int = 10  # Merge N rows into one chunk to reduce total chunks
@@ -71,18 +85,35 @@ class Settings(BaseSettings):
         "/model/qwen3-vl-4b"  # Local model path (serves both VLM and LLM)
     )
 
+    # HTTP Connection Pool Settings (shared by LLM and embedding clients)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 50
+    http_timeout: float = 60.0  # Seconds
+
     # Embedding Settings (Self-hosted)
     vllm_embed_url: str = "http://vllm-bge-m3:8000/v1"
     vllm_embed_model: str = "/model/bge-m3"
+    embedding_dimension: int = 1024  # bge-m3 dense vector size
+    embedding_batch_size: int = 512  # Texts per embedding request / upsert batch
 
     # Rerank Settings
     vllm_rerank_url: str = "http://vllm-bge-reranker:8000"
     vllm_rerank_model: str = "/model/bge-reranker-v2-m3"
     rerank_top_n_multiplier: int = 10  # top_n = k * multiplier for rerank candidates
+    # Rerank skip gates, applied when candidates are vector-only (no keyword
+    # matches); <=0 disables a gate. Off by default: skipped docs keep cosine
+    # scores and bypass rerank_score_threshold, while min_retrieval_score and
+    # the confidence levels downstream are tuned for rerank scores
+    rerank_skip_margin: float = 0.0  # Skip if cosine gap at k-th result >= margin
+    rerank_skip_gap: float = 0.0  # Skip if top-1 beats (k+1)-th by > gap
 
     # File Upload Settings
     max_file_size: int = 500 * 1024 * 1024  # 50MB
     max_files: int = 10
+    upload_chunk_size: int = 1024 * 1024  # Stream uploads to disk in 1MB chunks
+    max_upload_concurrency: int = 4  # Files of one upload processed concurrently
+    # Images above this size are base64-encoded in a worker thread
+    image_encode_offload_size: int = 1024 * 1024
 
     # Text Processing Settings
     chunk_size: int = 1000
@@ -91,11 +122,58 @@ class Settings(BaseSettings):
     # LLM Settings (Aliyun API & Local)
     llm_temperature: float = 0.0
     llm_max_tokens: int = 3500  # Max tokens for LLM response
+    # SDK retries with exponential backoff (timeouts, connection errors, 429/5xx)
+    llm_max_retries: int = 3
+    # Max in-flight LLM/VLM calls per worker (avoids provider 429 pile-ups)
+    llm_max_concurrency: int = 8
+    # Generate all violations of a hazard batch in one LLM call
+    # (per-hazard calls remain the fallback)
+    batch_violation_generation: bool = False
+    batch_violation_min_hazards: int = 3  # Smaller batches use per-hazard calls
 
     # RAG Retrieval Settings
     retrieval_score_threshold: float = 0.2  # Lowered: Let reranker do the filtering
     rerank_score_threshold: float = 0.3  # Minimum rerank score for filtering
     fetch_k_multiplier: int = 100  # Increased: Fetch more candidates for reranking
+    retrieval_hnsw_ef: int = 128  # HNSW search breadth for vector queries
+    collection_count_ttl: int = 60  # Seconds to cache collection sizes
+    max_retrieval_concurrency: int = 16  # Concurrent hybrid retrievals per collection
+
+    # Query Cache Settings (exact-match + semantic)
+    query_cache_enabled: bool = True
+    exact_query_cache_max_bytes: int = 100 * 1024 * 1024  # 100MB of cached docs
+    exact_query_cache_ttl: int = 300  # Seconds before an exact-match entry expires
+    # In-process semantic tier: reuse results of queries with near-identical
+    # embeddings (and identical keywords). Off by default, as safety wording
+    # that differs in one character can still embed within the threshold
+    semantic_query_cache_enabled: bool = False
+    query_cache_max_size: int = 2000  # Max cached queries per collection
+    query_cache_ttl: int = 600  # Seconds before a cached result expires
+    query_cache_threshold: float = 0.95  # Min cosine similarity for a cache hit
+    query_cache_lsh_tables: int = 8  # LSH hash tables for semantic lookups
+    query_cache_lsh_bits: int = 8  # Random projection bits per table
+    query_cache_bucket_size: int = 32  # Max entries per LSH bucket (LRU)
+    query_embedding_cache_max_size: int = 4096  # Cached query embeddings
+    persistent_query_cache_enabled: bool = False  # L2 cache in Qdrant (cross-worker)
+    persistent_query_cache_ttl: int = 86400  # Seconds before a persistent entry expires
+
+    # LLM Response Cache Settings (hazard extraction + violation generation)
+    llm_cache_enabled: bool = True
+    llm_cache_max_size: int = 1000  # Max cached responses per cache
+    llm_cache_ttl: int = 3600  # Seconds before a cached response expires
+    # Reuse violations for near-identical hazard wording with the same docs.
+    # Off by default: hazards differing in one character (安全帽 / 安全带)
+    # can embed within the threshold and would share a violation
+    llm_semantic_cache_enabled: bool = False
+    llm_semantic_cache_threshold: float = 0.95  # Min hazard cosine similarity
+
+    # Image Report Cache Settings (near-identical photos reuse the report)
+    # Off by default: a small scene change (a worker putting on a helmet)
+    # can keep the pHash within the distance and return a stale report
+    report_cache_enabled: bool = False
+    report_cache_max_size: int = 500  # Max cached reports
+    report_cache_ttl: int = 3600  # Seconds before a cached report expires
+    report_cache_max_distance: int = 0  # Max pHash Hamming distance for a hit
 
     # Multi-Collection Retrieval Settings
     regulations_retrieval_k: int = (
@@ -114,6 +192,7 @@ class Settings(BaseSettings):
     # Document Formatting Settings
     max_doc_length: int = 1500  # Max characters per document in context
     max_context_length: int = 3000  # Max total context length for LLM
+    max_prompt_docs: int = 3  # Max documents (best score first) in LLM prompt
 
     # Hard Threshold for Low Quality Retrieval
     min_retrieval_score: float = 0.3  # Below this score, return "no relevant docs"
@@ -161,7 +240,22 @@ class Settings(BaseSettings):
         "重大隐患",
     ]
 
-    @property
+    @cached_property
+    def hazard_categories_set(self) -> frozenset:
+        """Hazard categories as a frozenset for O(1) membership checks"""
+        return frozenset(self.hazard_categories)
+
+    @cached_property
+    def hazard_levels_set(self) -> frozenset:
+        """Hazard levels as a frozenset for O(1) membership checks"""
+        return frozenset(self.hazard_levels)
+
+    @cached_property
+    def excel_key_fields_set(self) -> frozenset:
+        """Excel key fields as a frozenset (built once, not per file)"""
+        return frozenset(self.excel_key_fields)
+
+    @cached_property
     def qdrant_url(self) -> str:
         return f"http://{self.qdrant_host}:{self.qdrant_port}"
 
@@ -170,10 +264,14 @@ class Settings(BaseSettings):
         "env_file_encoding": "utf-8",
         "case_sensitive": False,
         "extra": "ignore",
+        "frozen": True,  # Settings are read-only after startup
     }
 
 
-@lru_cache()
+# Built once at import: .env is parsed and validated a single time
+SETTINGS = Settings()
+
+
 def get_settings() -> Settings:
-    """Get cached settings instance"""
-    return Settings()
+    """Get shared settings instance"""
+    return SETTINGS
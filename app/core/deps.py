@@ -2,22 +2,75 @@
 Dependencies for dependency injection
 """
 
+import random
+import time
 from functools import lru_cache
+import httpx
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    PayloadSchemaType,
+    Range,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
 import cohere
 from loguru import logger
 
-from app.core.config import get_settings
+from app.core.config import SETTINGS
 
 
 @lru_cache()
 def get_qdrant_client() -> QdrantClient:
-    """Get Qdrant client instance"""
-    settings = get_settings()
-    return QdrantClient(url=settings.qdrant_url)
+    """Get Qdrant client instance (gRPC transport when enabled)"""
+    settings = SETTINGS
+    return QdrantClient(
+        host=settings.qdrant_host,
+        port=settings.qdrant_port,
+        grpc_port=settings.qdrant_grpc_port,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+    )
+
+
+@lru_cache()
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Get async Qdrant client instance for request-path queries"""
+    settings = SETTINGS
+    return AsyncQdrantClient(
+        host=settings.qdrant_host,
+        port=settings.qdrant_port,
+        grpc_port=settings.qdrant_grpc_port,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+    )
+
+
+@lru_cache()
+def get_http_async_client() -> httpx.AsyncClient:
+    """
+    Get shared async HTTP client with a keep-alive connection pool
+
+    Shared by LLM and embedding clients so requests reuse open connections
+    instead of paying TCP/TLS setup per call.
+    """
+    settings = SETTINGS
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        timeout=settings.http_timeout,
+    )
 
 
 @lru_cache()
@@ -29,7 +82,7 @@ def get_llm() -> ChatOpenAI:
     - 'aliyun': Use Aliyun DashScope API
     - 'local': Use local vLLM service
     """
-    settings = get_settings()
+    settings = SETTINGS
     import os
 
     if settings.deployment_mode == "aliyun":
@@ -48,7 +101,9 @@ def get_llm() -> ChatOpenAI:
             base_url=settings.dashscope_base_url,
             temperature=settings.llm_temperature,
             max_tokens=settings.llm_max_tokens,
+            max_retries=settings.llm_max_retries,
             extra_body={"chat_template_kwargs": {"enable_thinking": False}},
+            http_async_client=get_http_async_client(),
         )
     else:  # local mode
         logger.info("Initializing LLM with local vLLM service")
@@ -58,7 +113,9 @@ def get_llm() -> ChatOpenAI:
             base_url=settings.vllm_llm_url,
             temperature=settings.llm_temperature,
             max_tokens=settings.llm_max_tokens,
+            max_retries=settings.llm_max_retries,
             extra_body={"chat_template_kwargs": {"enable_thinking": False}},
+            http_async_client=get_http_async_client(),
         )
 
 
@@ -74,17 +131,24 @@ def get_vlm() -> ChatOpenAI:
 @lru_cache()
 def get_embeddings() -> OpenAIEmbeddings:
     """Get embeddings instance"""
-    settings = get_settings()
+    settings = SETTINGS
     return OpenAIEmbeddings(
         model=settings.vllm_embed_model,
         api_key="not-needed",
         base_url=settings.vllm_embed_url,
         check_embedding_ctx_length=False,
+        chunk_size=settings.embedding_batch_size,  # Texts per embedding request
+        max_retries=3,
+        http_async_client=get_http_async_client(),
     )
 
 
+@lru_cache()
 def get_vector_store(collection_type: str = "regulations") -> QdrantVectorStore:
-    """Get vector store instance for specific collection type
+    """Get shared vector store instance for specific collection type
+
+    Built once per collection (construction validates the collection over
+    the network) and reused by all services.
 
     Args:
         collection_type: Type of collection - 'regulations', 'hazard_db', or 'qa'
@@ -92,7 +156,7 @@ def get_vector_store(collection_type: str = "regulations") -> QdrantVectorStore:
     Returns:
         QdrantVectorStore instance
     """
-    settings = get_settings()
+    settings = SETTINGS
 
     # Map collection type to collection name
     collection_map = {
@@ -118,7 +182,7 @@ def ensure_collection(collection_type: str = "all") -> None:
     Args:
         collection_type: 'all', 'regulations', 'hazard_db', or 'qa'
     """
-    settings = get_settings()
+    settings = SETTINGS
     client = get_qdrant_client()
 
     # Determine which collections to create
@@ -136,41 +200,164 @@ def ensure_collection(collection_type: str = "all") -> None:
     elif collection_type == "qa":
         collections_to_create = [settings.qdrant_collection_qa]
 
+    # Quantized codes kept in RAM, full vectors on disk for rescoring
+    if settings.qdrant_quantization == "int8":
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True)
+        )
+    elif settings.qdrant_quantization == "binary":
+        quantization_config = BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=True)
+        )
+    else:
+        quantization_config = None
+
     # Create collections if they don't exist
     for collection_name in collections_to_create:
-        try:
-            client.get_collection(collection_name)
-        except:
+        if client.collection_exists(collection_name):
+            payload_schema = client.get_collection(collection_name).payload_schema
+        else:
+            payload_schema = {}
             client.create_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
+                vectors_config=VectorParams(
+                    size=settings.embedding_dimension,
+                    distance=Distance.COSINE,
+                    on_disk=quantization_config is not None,
+                ),
+                # Keep the HNSW graph in RAM even when raw vectors are on disk
+                hnsw_config=HnswConfigDiff(
+                    m=settings.qdrant_hnsw_m,
+                    ef_construct=settings.qdrant_hnsw_ef_construct,
+                    on_disk=False,
+                ),
+                optimizers_config=OptimizersConfigDiff(
+                    indexing_threshold=settings.qdrant_indexing_threshold,
+                    default_segment_number=settings.qdrant_default_segment_number,
+                ),
+                quantization_config=quantization_config,
+            )
+
+        # Keyword index for filename filters and server-side facet counts
+        # (also backfills collections created before the index existed)
+        if "metadata.filename" not in payload_schema:
+            client.create_payload_index(
+                collection_name, "metadata.filename", PayloadSchemaType.KEYWORD
             )
 
 
+def ensure_query_cache_collection() -> None:
+    """Ensure the persistent query cache collection exists (if enabled)
+
+    Creates the collection with keyword/float payload indexes for the
+    lookup filter, and drops entries that expired while the service was down.
+    """
+    settings = SETTINGS
+    if not (settings.query_cache_enabled and settings.persistent_query_cache_enabled):
+        return
+
+    client = get_qdrant_client()
+    collection_name = settings.qdrant_collection_query_cache
+
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(
+                size=settings.embedding_dimension, distance=Distance.COSINE
+            ),
+            hnsw_config=HnswConfigDiff(
+                m=settings.qdrant_hnsw_m,
+                ef_construct=settings.qdrant_hnsw_ef_construct,
+            ),
+        )
+        client.create_payload_index(
+            collection_name, "collection", PayloadSchemaType.KEYWORD
+        )
+        client.create_payload_index(
+            collection_name, "config_hash", PayloadSchemaType.KEYWORD
+        )
+        client.create_payload_index(
+            collection_name, "created_at", PayloadSchemaType.FLOAT
+        )
+        return
+
+    client.delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(
+            filter=Filter(
+                must=[
+                    FieldCondition(
+                        key="created_at",
+                        range=Range(
+                            lt=time.time() - settings.persistent_query_cache_ttl
+                        ),
+                    )
+                ]
+            )
+        ),
+    )
+
+
+def warmup_collections() -> None:
+    """Issue a few queries per collection to page HNSW graphs into memory
+
+    Uses random vectors so warm-up doesn't depend on the embedding
+    service. Failures are logged and never block startup.
+    """
+    settings = SETTINGS
+    client = get_qdrant_client()
+    collections = [
+        settings.qdrant_collection_regulations,
+        settings.qdrant_collection_hazard_db,
+        settings.qdrant_collection_qa,
+    ]
+
+    for collection_name in collections:
+        try:
+            for _ in range(settings.qdrant_warmup_queries):
+                vector = [
+                    random.gauss(0.0, 1.0) for _ in range(settings.embedding_dimension)
+                ]
+                client.query_points(
+                    collection_name=collection_name,
+                    query=vector,
+                    limit=10,
+                    with_payload=False,
+                )
+        except Exception as e:
+            logger.warning(f"Warm-up of collection {collection_name} failed: {e}")
+
+
 @lru_cache()
-def get_reranker_client() -> cohere.ClientV2:
+def get_reranker_client() -> cohere.AsyncClientV2:
     """
-    Get Cohere Rerank client instance (connected to vLLM)
+    Get async Cohere Rerank client instance (connected to vLLM)
 
-    vLLM's /v1/rerank endpoint is compatible with Cohere API
+    vLLM's /v1/rerank endpoint is compatible with Cohere API. Uses the
+    shared keep-alive HTTP pool so rerank calls don't block the event loop
+    or reconnect per request.
     """
-    settings = get_settings()
+    settings = SETTINGS
     rerank_url = settings.vllm_rerank_url
 
-    return cohere.ClientV2(
-        api_key="dummy-key", base_url=rerank_url  # vLLM doesn't validate API keys
+    return cohere.AsyncClientV2(
+        api_key="dummy-key",  # vLLM doesn't validate API keys
+        base_url=rerank_url,
+        httpx_client=get_http_async_client(),
     )
 
 
+@lru_cache()
 def get_document_service():
-    """Get document service instance for dependency injection"""
+    """Get document service instance for dependency injection (shared, stateless)"""
     from app.services.document_service import DocumentService
 
     return DocumentService()
 
 
+@lru_cache()
 def get_analysis_service():
-    """Get analysis service instance for dependency injection"""
+    """Get analysis service instance for dependency injection (shared, stateless)"""
     from app.services.analysis_service import AnalysisService
 
     return AnalysisService()
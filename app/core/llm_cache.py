@@ -0,0 +1,196 @@
+"""
+Response caches for LLM/VLM calls
+
+Inspection images and hazard descriptions repeat heavily, and both model
+calls are deterministic functions of their prompt (temperature 0), so
+successful responses are cached in-process and reused:
+- hazard extraction: keyed by image content
+- violation generation: keyed by the full prompt (hazard + retrieved docs),
+  plus a semantic tier where a differently worded but near-identical hazard
+  with the same retrieved docs reuses the response
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import BaseMessage
+
+from app.core.config import get_settings
+
+
+def make_content_key(*parts: str) -> str:
+    """Build cache key from text parts (prompt contents, base64 image, ...)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def make_messages_key(messages: Sequence[BaseMessage]) -> str:
+    """Build cache key from chat messages with plain-text content"""
+    return make_content_key(
+        *(f"{message.type}:{message.content}" for message in messages)
+    )
+
+
+class LLMResponseCache:
+    """
+    Thread-safe LRU + TTL cache of LLM responses
+
+    Values must be immutable or copied by the caller (e.g. tuples,
+    pydantic models via model_copy).
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # key -> (value, expires_at)
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get cached response, or None on miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        """Store response, evicting least recently used entries"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+
+
+class SemanticResponseCache:
+    """
+    Thread-safe LRU + TTL cache of LLM responses matched by embedding
+
+    Entries are grouped by an exact key for everything except the varying
+    text (e.g. the retrieved documents); within a group, a lookup hits when
+    the text embedding's cosine similarity reaches the threshold.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 3600,
+        threshold: float = 0.95,
+        group_size: int = 16,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.group_size = group_size
+
+        self._lock = threading.Lock()
+        # group_key -> [(unit vector, value, expires_at)], newest last
+        self._groups: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm > 0 else arr
+
+    def get(self, group_key: str, vector: List[float]) -> Optional[Any]:
+        """Get response for the most similar cached text in the group"""
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._groups.get(group_key)
+            if entries:
+                entries[:] = [entry for entry in entries if entry[2] > now]
+            if not entries:
+                self._groups.pop(group_key, None)
+                self.misses += 1
+                return None
+
+            similarities = np.stack([entry[0] for entry in entries]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._groups.move_to_end(group_key)
+            self.hits += 1
+            return entries[best][1]
+
+    def put(self, group_key: str, vector: List[float], value: Any) -> None:
+        """Store response, evicting least recently used groups"""
+        with self._lock:
+            entries = self._groups.setdefault(group_key, [])
+            entries.append(
+                (self._normalize(vector), value, time.monotonic() + self.ttl)
+            )
+            del entries[: -self.group_size]
+            self._groups.move_to_end(group_key)
+            while len(self._groups) > self.max_size:
+                self._groups.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        with self._lock:
+            self._groups.clear()
+
+
+@lru_cache()
+def get_hazard_cache() -> Optional[LLMResponseCache]:
+    """Get VLM hazard extraction cache, or None when disabled"""
+    settings = get_settings()
+    if not settings.llm_cache_enabled:
+        return None
+    return LLMResponseCache(
+        max_size=settings.llm_cache_max_size, ttl=settings.llm_cache_ttl
+    )
+
+
+@lru_cache()
+def get_violation_cache() -> Optional[LLMResponseCache]:
+    """Get violation generation cache, or None when disabled"""
+    settings = get_settings()
+    if not settings.llm_cache_enabled:
+        return None
+    return LLMResponseCache(
+        max_size=settings.llm_cache_max_size, ttl=settings.llm_cache_ttl
+    )
+
+
+@lru_cache()
+def get_semantic_violation_cache() -> Optional[SemanticResponseCache]:
+    """Get semantic violation cache (near-identical hazards), or None when disabled"""
+    settings = get_settings()
+    if not (settings.llm_cache_enabled and settings.llm_semantic_cache_enabled):
+        return None
+    return SemanticResponseCache(
+        max_size=settings.llm_cache_max_size,
+        ttl=settings.llm_cache_ttl,
+        threshold=settings.llm_semantic_cache_threshold,
+    )
@@ -0,0 +1,682 @@
+"""
+Query caches for retrieval results
+
+Hazard descriptions produced by the VLM repeat heavily across images
+("未佩戴安全帽", "临边无防护"), so retrieval results are cached in tiers:
+- ExactQueryCache: normalized query text → documents (no embedding needed)
+- SemanticQueryCache: a new query whose embedding is close enough to a
+  cached one reuses that entry's documents instead of hitting Qdrant and
+  the reranker
+- PersistentQueryCache (optional L2): semantic cache stored in a Qdrant
+  collection, shared across workers and surviving restarts
+
+QueryEmbeddingCache sits below the semantic tiers: query text → embedding,
+shared by all collections, so a hazard is embedded once per process even
+when several collections are searched for it.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, Callable, Hashable, List, Optional, Sequence
+
+from loguru import logger
+
+import numpy as np
+import orjson
+from langchain_core.documents import Document
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    PointStruct,
+    QueryRequest,
+    Range,
+)
+
+from app.core.config import get_settings
+
+# Monotonic corpus version, bumped on every document upsert/delete.
+# Cache entries stored under an older version are treated as misses.
+_corpus_version = 0
+_corpus_version_lock = threading.Lock()
+
+
+def get_corpus_version() -> int:
+    """Get current corpus version"""
+    return _corpus_version
+
+
+def bump_corpus_version() -> int:
+    """Invalidate cached retrieval results after the corpus changed"""
+    global _corpus_version
+    with _corpus_version_lock:
+        _corpus_version += 1
+        return _corpus_version
+
+
+def _copy_documents(docs: List[Document]) -> List[Document]:
+    """Copy documents so callers can't mutate cached metadata"""
+    return [
+        Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+        for doc in docs
+    ]
+
+
+def make_query_key(query: str, *params) -> str:
+    """Build exact-match cache key from normalized query text and parameters"""
+    digest = hashlib.blake2b(
+        query.strip().lower().encode("utf-8"), digest_size=16
+    ).hexdigest()
+    return f"{digest}:{orjson.dumps(params).decode()}"
+
+
+def _documents_size(docs: List[Document]) -> int:
+    """Approximate memory footprint of documents in bytes"""
+    return sum(
+        len(doc.page_content.encode("utf-8")) + len(str(doc.metadata)) for doc in docs
+    )
+
+
+class ExactQueryCache:
+    """
+    Thread-safe LRU + TTL cache of retrieval results keyed by query text
+
+    Bounded by total cached document size (max_bytes); least recently used
+    entries are evicted first. Entries from an older corpus version or
+    past their ttl are treated as misses.
+    """
+
+    def __init__(self, max_bytes: int = 100 * 1024 * 1024, ttl: float = 300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # key -> (docs, size_bytes, corpus_version, expires_at)
+        self._entries: OrderedDict = OrderedDict()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        """Get copy of cached documents, or None on miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            docs, size_bytes, version, expires_at = entry
+            if version != get_corpus_version() or expires_at <= time.monotonic():
+                del self._entries[key]
+                self._total_bytes -= size_bytes
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_documents(docs)
+
+    def put(
+        self, key: str, docs: List[Document], version: Optional[int] = None
+    ) -> None:
+        """
+        Store retrieval result, evicting least recently used entries
+
+        Args:
+            version: Corpus version read before the retrieval started; the
+                result is dropped if the corpus changed since
+        """
+        docs = _copy_documents(docs)
+        size_bytes = _documents_size(docs)
+        if size_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            current_version = get_corpus_version()
+            if version is not None and version != current_version:
+                return
+
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._total_bytes -= old_entry[1]
+
+            self._entries[key] = (
+                docs,
+                size_bytes,
+                current_version,
+                time.monotonic() + self.ttl,
+            )
+            self._total_bytes += size_bytes
+
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted[1]
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+class SemanticQueryCache:
+    """
+    Thread-safe cache of retrieval results keyed by query embedding
+
+    Candidates are found with random-projection LSH: each of num_tables
+    hash tables maps a num_bits sign signature of the L2-normalized
+    embedding to a bucket of entry ids, so a lookup computes exact cosine
+    similarity only against the few entries sharing a bucket. Buckets keep
+    at most bucket_size entries (LRU), entries expire after ttl seconds and
+    the least recently used entry is evicted once max_size is reached.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2000,
+        ttl: float = 600,
+        threshold: float = 0.95,
+        num_tables: int = 8,
+        num_bits: int = 8,
+        bucket_size: int = 32,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.bucket_size = bucket_size
+
+        self._lock = threading.Lock()
+        self._projections: Optional[np.ndarray] = None  # Built on first use
+        # signature -> OrderedDict[entry_id, None] (LRU order), one per table
+        self._tables: List[dict] = [{} for _ in range(num_tables)]
+        # entry_id -> (vector, docs, params, corpus_version, expires_at, signatures)
+        self._entries: OrderedDict = OrderedDict()
+        self._next_id = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm > 0 else arr
+
+    def _signatures(self, query: np.ndarray) -> List[bytes]:
+        """Compute one packed sign signature per hash table"""
+        if self._projections is None:
+            rng = np.random.default_rng(0)
+            self._projections = rng.standard_normal(
+                (query.shape[0], self.num_tables * self.num_bits)
+            ).astype(np.float32)
+
+        bits = (query @ self._projections > 0).reshape(self.num_tables, self.num_bits)
+        return [np.packbits(row).tobytes() for row in bits]
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for table, signature in zip(self._tables, entry[5]):
+            bucket = table.get(signature)
+            if bucket is not None:
+                bucket.pop(entry_id, None)
+                if not bucket:
+                    del table[signature]
+
+    def get(
+        self, vector: List[float], params: Hashable = None
+    ) -> Optional[List[Document]]:
+        """
+        Look up cached documents for a query embedding
+
+        Args:
+            vector: Query embedding
+            params: Retrieval parameters the cached result must match (e.g. k)
+
+        Returns:
+            Copy of cached documents on hit, None on miss
+        """
+        with self._lock:
+            if not self._entries:
+                return None
+
+            query = self._normalize(vector)
+            signatures = self._signatures(query)
+
+            candidate_ids = set()
+            for table, signature in zip(self._tables, signatures):
+                bucket = table.get(signature)
+                if bucket:
+                    candidate_ids.update(bucket)
+
+            now = time.monotonic()
+            version = get_corpus_version()
+            best_id, best_similarity = None, self.threshold
+            for entry_id in candidate_ids:
+                entry_vector, _, entry_params, entry_version, expires_at, _ = (
+                    self._entries[entry_id]
+                )
+                if (
+                    entry_params != params
+                    or entry_version != version
+                    or expires_at <= now
+                ):
+                    continue
+                similarity = float(entry_vector @ query)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                return None
+
+            # Refresh LRU position globally and in each bucket
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            for table, signature in zip(self._tables, entry[5]):
+                table[signature].move_to_end(best_id)
+            return _copy_documents(entry[1])
+
+    def put(
+        self,
+        vector: List[float],
+        docs: List[Document],
+        params: Hashable = None,
+        version: Optional[int] = None,
+    ) -> None:
+        """
+        Store retrieval result for a query embedding
+
+        Args:
+            version: Corpus version read before the retrieval started; the
+                result is dropped if the corpus changed since
+        """
+        query = self._normalize(vector)
+        docs = _copy_documents(docs)
+
+        with self._lock:
+            current_version = get_corpus_version()
+            if version is not None and version != current_version:
+                return
+
+            signatures = self._signatures(query)
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._entries[entry_id] = (
+                query,
+                docs,
+                params,
+                current_version,
+                time.monotonic() + self.ttl,
+                signatures,
+            )
+            for table, signature in zip(self._tables, signatures):
+                bucket = table.setdefault(signature, OrderedDict())
+                bucket[entry_id] = None
+                if len(bucket) > self.bucket_size:
+                    self._remove(next(iter(bucket)))
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._tables = [{} for _ in range(self.num_tables)]
+            self._entries.clear()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings shared by all collections
+
+    Embeddings don't depend on the corpus, so entries never need
+    invalidation. Concurrent lookups of the same text share one in-flight
+    request: querying regulations and hazard_db together embeds each
+    hazard once. Must be used from a single event loop.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        # text -> Future[List[float]] (done once embedded)
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def embed(
+        self,
+        texts: Sequence[str],
+        embed_documents: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        """
+        Get embeddings for texts, embedding only unseen ones in one call
+
+        Args:
+            texts: Query texts
+            embed_documents: Batch embedding function for cache misses
+
+        Returns:
+            One embedding per text (same order)
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        missing = {}  # text -> future owned by this call
+        for text in texts:
+            future = self._entries.get(text)
+            if future is None:
+                future = loop.create_future()
+                # Mark failures as retrieved even if no other caller waits
+                future.add_done_callback(
+                    lambda f: f.cancelled() or f.exception()
+                )
+                self._entries[text] = future
+                missing[text] = future
+                self.misses += 1
+            else:
+                self._entries.move_to_end(text)
+                self.hits += 1
+            futures.append(future)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        if missing:
+            try:
+                vectors = await embed_documents(list(missing))
+            except BaseException as e:
+                # Drop failed entries; waiters get a plain error (not a
+                # cancellation) and fall back like on their own failure
+                for text, future in missing.items():
+                    if self._entries.get(text) is future:
+                        del self._entries[text]
+                    future.set_exception(
+                        e
+                        if isinstance(e, Exception)
+                        else RuntimeError("Query embedding cancelled")
+                    )
+                raise
+            for future, vector in zip(missing.values(), vectors):
+                future.set_result(vector)
+
+        return [await future for future in futures]
+
+
+class PersistentQueryCache:
+    """
+    Semantic query cache stored in a dedicated Qdrant collection
+
+    Each point holds a query embedding and the retrieval result for it,
+    tagged with the source collection and a config hash (retrieval params
+    plus the settings that shape results), so lookups never cross
+    configurations. Being shared storage, it is invalidated per source
+    collection on upload/delete, which is visible to every worker.
+
+    Entries are stamped with the time their retrieval started, and each
+    invalidation leaves a marker point with its time; lookups ignore entries
+    older than the marker. A retrieval in flight on any worker during an
+    upload therefore can't write pre-upload results back as fresh ones.
+    """
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str,
+        ttl: float = 86400,
+        threshold: float = 0.95,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.threshold = threshold
+
+        settings = get_settings()
+        # Changing any of these changes results, so old entries must not match
+        self._settings_fingerprint = (
+            settings.vllm_embed_model,
+            settings.vllm_rerank_model,
+            settings.rerank_score_threshold,
+            settings.rerank_top_n_multiplier,
+            settings.fetch_k_multiplier,
+        )
+
+    def _config_hash(self, params: Hashable) -> str:
+        return hashlib.blake2b(
+            orjson.dumps([params, self._settings_fingerprint]),
+            digest_size=16,
+        ).hexdigest()
+
+    def _marker_id(self, source_collection: str) -> str:
+        """Point id of a source collection's invalidation marker"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"invalidated:{source_collection}"))
+
+    async def _invalidated_at(self, source_collection: str) -> float:
+        """Time of the last invalidation of a source collection (0 if none)"""
+        points = await self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=[self._marker_id(source_collection)],
+            with_payload=True,
+            with_vectors=False,
+        )
+        return points[0].payload.get("invalidated_at", 0.0) if points else 0.0
+
+    def _filter(self, source_collection: str, params: Hashable) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(
+                    key="collection", match=MatchValue(value=source_collection)
+                ),
+                FieldCondition(
+                    key="config_hash",
+                    match=MatchValue(value=self._config_hash(params)),
+                ),
+                FieldCondition(
+                    key="created_at", range=Range(gte=time.time() - self.ttl)
+                ),
+            ]
+        )
+
+    async def get_many(
+        self,
+        source_collection: str,
+        vectors: Sequence[List[float]],
+        params_list: Sequence[Hashable],
+    ) -> List[Optional[List[Document]]]:
+        """
+        Look up cached documents for several query embeddings in one request
+
+        Args:
+            params_list: Per vector, the parameters a cached result must match
+
+        Returns:
+            Per vector: cached documents on hit, None on miss
+        """
+        responses, invalidated_at = await asyncio.gather(
+            self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=[
+                    QueryRequest(
+                        query=vector,
+                        filter=self._filter(source_collection, params),
+                        limit=1,
+                        score_threshold=self.threshold,
+                        with_payload=True,
+                        with_vector=False,
+                    )
+                    for vector, params in zip(vectors, params_list)
+                ],
+            ),
+            self._invalidated_at(source_collection),
+        )
+        return [
+            (
+                [
+                    Document(
+                        page_content=doc["page_content"], metadata=doc["metadata"]
+                    )
+                    for doc in response.points[0].payload["docs"]
+                ]
+                if response.points
+                and response.points[0].payload["created_at"] >= invalidated_at
+                else None
+            )
+            for response in responses
+        ]
+
+    async def put_many(
+        self,
+        source_collection: str,
+        keys: Sequence[str],
+        vectors: Sequence[List[float]],
+        docs_list: Sequence[List[Document]],
+        params_list: Sequence[Hashable],
+        version: Optional[int] = None,
+        started_at: Optional[float] = None,
+    ) -> None:
+        """
+        Store retrieval results for several queries in one upsert
+
+        Args:
+            keys: Exact-match query keys; re-storing a query overwrites its point
+            params_list: Per query, the parameters the result was computed with
+            version: Corpus version read before the retrieval started; the
+                results are dropped if this process invalidated since
+            started_at: Wall-clock time the retrieval started; entries older
+                than a later invalidation (from any worker) never match
+        """
+        if version is not None and version != get_corpus_version():
+            return
+
+        created_at = started_at if started_at is not None else time.time()
+        await self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(
+                    id=str(uuid.uuid5(uuid.NAMESPACE_URL, key)),
+                    vector=vector,
+                    payload={
+                        "collection": source_collection,
+                        "config_hash": self._config_hash(params),
+                        "created_at": created_at,
+                        "docs": [
+                            {
+                                "page_content": doc.page_content,
+                                "metadata": doc.metadata,
+                            }
+                            for doc in docs
+                        ],
+                    },
+                )
+                for key, vector, docs, params in zip(
+                    keys, vectors, docs_list, params_list
+                )
+            ],
+            wait=False,
+        )
+
+    async def invalidate(self, source_collection: str) -> None:
+        """Drop all cached results for a source collection"""
+        invalidated_at = time.time()
+        await self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(
+                    must=[
+                        FieldCondition(
+                            key="collection",
+                            match=MatchValue(value=source_collection),
+                        )
+                    ]
+                )
+            ),
+        )
+        # Marker (re-created after the delete, which removes the old one):
+        # results written later by retrievals started before this point are
+        # ignored by get_many
+        await self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                PointStruct(
+                    id=self._marker_id(source_collection),
+                    vector=[1.0] * get_settings().embedding_dimension,
+                    payload={
+                        "collection": source_collection,
+                        "invalidated_at": invalidated_at,
+                    },
+                )
+            ],
+        )
+
+
+@lru_cache()
+def get_exact_query_cache() -> ExactQueryCache:
+    """Get exact-match query cache (shared across requests and collections)"""
+    settings = get_settings()
+    return ExactQueryCache(
+        max_bytes=settings.exact_query_cache_max_bytes,
+        ttl=settings.exact_query_cache_ttl,
+    )
+
+
+@lru_cache()
+def get_query_cache(collection_name: str) -> SemanticQueryCache:
+    """Get semantic query cache for a collection (shared across requests)"""
+    settings = get_settings()
+    return SemanticQueryCache(
+        max_size=settings.query_cache_max_size,
+        ttl=settings.query_cache_ttl,
+        threshold=settings.query_cache_threshold,
+        num_tables=settings.query_cache_lsh_tables,
+        num_bits=settings.query_cache_lsh_bits,
+        bucket_size=settings.query_cache_bucket_size,
+    )
+
+
+@lru_cache()
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Get query embedding cache (shared across requests and collections)"""
+    return QueryEmbeddingCache(max_size=get_settings().query_embedding_cache_max_size)
+
+
+@lru_cache()
+def get_persistent_query_cache() -> Optional[PersistentQueryCache]:
+    """Get persistent (Qdrant-backed) query cache, or None when disabled"""
+    from app.core.deps import get_async_qdrant_client
+
+    settings = get_settings()
+    if not (settings.query_cache_enabled and settings.persistent_query_cache_enabled):
+        return None
+    return PersistentQueryCache(
+        client=get_async_qdrant_client(),
+        collection_name=settings.qdrant_collection_query_cache,
+        ttl=settings.persistent_query_cache_ttl,
+        threshold=settings.query_cache_threshold,
+    )
+
+
+async def invalidate_collection(collection_name: str) -> None:
+    """
+    Invalidate cached retrieval results after a collection changed
+
+    Bumps the in-process corpus version (exact + semantic tiers) and drops
+    the collection's entries from the persistent tier.
+    """
+    bump_corpus_version()
+
+    persistent_cache = get_persistent_query_cache()
+    if persistent_cache is not None:
+        try:
+            await persistent_cache.invalidate(collection_name)
+        except Exception as e:
+            logger.warning(f"Persistent query cache invalidation failed: {e}")
@@ -0,0 +1,121 @@
+"""
+Image-level report cache keyed by perceptual hash
+
+Operators often submit the same or near-identical photos (same camera,
+same scene). The whole analysis pipeline is deterministic given the image,
+so finished reports are cached and reused when a new image's perceptual
+hash is within a small Hamming distance of a cached one. Entries are
+invalidated together with the query caches when the corpus changes.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import imagehash
+from PIL import Image
+
+from app.core.config import get_settings
+from app.core.query_cache import get_corpus_version
+from app.schemas.safety import SafetyReport
+
+# Minimum decode size for hashing (phash resizes to 32x32 internally)
+_PHASH_DECODE_SIZE = 64
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """Compute 64-bit pHash of an image (CPU-bound, run in a thread)"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # pHash only looks at a 32x32 grayscale thumbnail; let the JPEG
+        # decoder downscale in the DCT domain instead of decoding full size
+        image.draft("L", (_PHASH_DECODE_SIZE, _PHASH_DECODE_SIZE))
+        return int(str(imagehash.phash(image)), 16)
+
+
+class PerceptualReportCache:
+    """
+    Thread-safe LRU + TTL cache of SafetyReports keyed by perceptual hash
+
+    Lookup scans all entries for the closest hash within max_distance bits;
+    with a few hundred entries this is a handful of integer XORs.
+    """
+
+    def __init__(self, max_size: int = 500, ttl: float = 3600, max_distance: int = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+
+        self._lock = threading.Lock()
+        # (phash, variant) -> (report, corpus_version, expires_at)
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phash: int, variant: str = "") -> Optional[SafetyReport]:
+        """
+        Get report cached for a perceptually similar image
+
+        Args:
+            phash: Perceptual hash of the image
+            variant: Other request inputs the report depends on (user hazards)
+
+        Returns:
+            Cached SafetyReport, or None on miss
+        """
+        version = get_corpus_version()
+        now = time.monotonic()
+        with self._lock:
+            best_key: Optional[Tuple[int, str]] = None
+            best_distance = self.max_distance + 1
+            for key, (_, entry_version, expires_at) in self._entries.items():
+                if key[1] != variant or entry_version != version or expires_at <= now:
+                    continue
+                distance = (key[0] ^ phash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            report = self._entries[best_key][0]
+        # Callers own the returned report (hazard_id may be rewritten, etc.)
+        return report.model_copy(deep=True)
+
+    def put(self, phash: int, report: SafetyReport, variant: str = "") -> None:
+        """Store report, evicting least recently used entries"""
+        report = report.model_copy(deep=True)
+        with self._lock:
+            key = (phash, variant)
+            self._entries[key] = (
+                report,
+                get_corpus_version(),
+                time.monotonic() + self.ttl,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached reports"""
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache()
+def get_report_cache() -> Optional[PerceptualReportCache]:
+    """Get image report cache, or None when disabled"""
+    settings = get_settings()
+    if not settings.report_cache_enabled:
+        return None
+    return PerceptualReportCache(
+        max_size=settings.report_cache_max_size,
+        ttl=settings.report_cache_ttl,
+        max_distance=settings.report_cache_max_distance,
+    )
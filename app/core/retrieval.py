@@ -4,19 +4,65 @@ Advanced retrieval strategies for RAG
 Implements various retrieval techniques following LangChain best practices
 """
 
+import asyncio
 import re
-from typing import List, Optional, Set
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from langchain_core.documents import Document
 import cohere
 from loguru import logger
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import QuantizationSearchParams, SearchParams
+
+from app.core.config import get_settings
+from app.core.deps import get_async_qdrant_client
+from app.core.query_cache import (
+    get_corpus_version,
+    get_exact_query_cache,
+    get_persistent_query_cache,
+    get_query_cache,
+    get_query_embedding_cache,
+    make_query_key,
+)
+
+# collection_name -> (corpus_version, expires_at, point count)
+_collection_counts: Dict[str, Tuple[int, float, int]] = {}
+
+# Strong references to in-flight background tasks (prefetch, start_batch);
+# the event loop only keeps weak references, so untracked tasks may be
+# garbage collected
+_background_tasks: Set[asyncio.Task] = set()
 
 
 class SafetyRetriever:
     """Advanced retriever with multiple strategies"""
 
-    def __init__(self, vector_store, reranker_client: Optional[cohere.ClientV2] = None):
+    def __init__(
+        self,
+        vector_store,
+        reranker_client: Optional[cohere.AsyncClientV2] = None,
+        async_client: Optional[AsyncQdrantClient] = None,
+    ):
         self.vector_store = vector_store
         self.reranker = reranker_client
+        # Non-blocking client for queries issued from async code
+        self.async_client = async_client or get_async_qdrant_client()
+        self.settings = get_settings()
+        # Bounds concurrent keyword scrolls + reranks against this collection
+        self._retrieval_semaphore = asyncio.Semaphore(
+            self.settings.max_retrieval_concurrency
+        )
+
+        # Qdrant search params shared by all vector queries: search on
+        # quantized codes, rescore with original vectors
+        self.search_params = SearchParams(
+            hnsw_ef=self.settings.retrieval_hnsw_ef,
+            quantization=QuantizationSearchParams(
+                ignore=False,
+                rescore=True,
+                oversampling=self.settings.qdrant_quantization_oversampling,
+            ),
+        )
 
     def _number_to_chinese(self, num: int) -> str:
         """Convert Arabic number to Chinese number (1-999)"""
@@ -193,6 +239,13 @@ class SafetyRetriever:
 
         return result
 
+    def _keyword_signature(self, query: str) -> tuple:
+        """Extracted keywords of a query as a hashable, order-independent tuple"""
+        return tuple(
+            (key, tuple(sorted(values)))
+            for key, values in sorted(self._extract_keywords(query).items())
+        )
+
     def _get_flat_keywords(self, extracted: dict) -> List[str]:
         """Convert extracted keywords dict to flat list for text matching"""
         keywords = []
@@ -219,13 +272,14 @@ class SafetyRetriever:
         Combines with article number and keyword matching for precision.
         """
         try:
-            from qdrant_client import QdrantClient
-            from qdrant_client.models import FieldCondition, MatchText, Filter
-
-            from app.core.config import get_settings
+            from qdrant_client.models import (
+                FieldCondition,
+                MatchText,
+                Filter,
+                MinShould,
+            )
 
-            settings = get_settings()
-            client = QdrantClient(url=settings.qdrant_url)
+            client = self.async_client
             collection_name = self.vector_store.collection_name
 
             matched_docs = []
@@ -262,15 +316,15 @@ class SafetyRetriever:
                         ]
                         # Search with doc name + article number
                         try:
-                            results = client.scroll(
+                            results = await client.scroll(
                                 collection_name=collection_name,
                                 scroll_filter=Filter(
                                     must=must_conditions,
                                     should=should_conditions,
-                                    min_should={
-                                        "conditions": should_conditions,
-                                        "min_count": 1,
-                                    },
+                                    min_should=MinShould(
+                                        conditions=should_conditions,
+                                        min_count=1,
+                                    ),
                                 ),
                                 limit=k,
                                 with_payload=True,
@@ -295,7 +349,7 @@ class SafetyRetriever:
 
                     # Also get all chunks from this document (broader match)
                     try:
-                        results = client.scroll(
+                        results = await client.scroll(
                             collection_name=collection_name,
                             scroll_filter=Filter(must=must_conditions),
                             limit=k // 2,
@@ -321,16 +375,16 @@ class SafetyRetriever:
             if article_numbers and not doc_names:
                 for article_num in article_numbers:
                     try:
-                        results = client.scroll(
+                        results = await client.scroll(
                             collection_name=collection_name,
-                            scroll_filter={
-                                "must": [
-                                    {
-                                        "key": "page_content",
-                                        "match": {"text": article_num},
-                                    }
+                            scroll_filter=Filter(
+                                must=[
+                                    FieldCondition(
+                                        key="page_content",
+                                        match=MatchText(text=article_num),
+                                    )
                                 ]
-                            },
+                            ),
                             limit=k // 2,
                             with_payload=True,
                         )
@@ -355,13 +409,15 @@ class SafetyRetriever:
                 if len(standard) < 3:
                     continue
                 try:
-                    results = client.scroll(
+                    results = await client.scroll(
                         collection_name=collection_name,
-                        scroll_filter={
-                            "must": [
-                                {"key": "page_content", "match": {"text": standard}}
+                        scroll_filter=Filter(
+                            must=[
+                                FieldCondition(
+                                    key="page_content", match=MatchText(text=standard)
+                                )
                             ]
-                        },
+                        ),
                         limit=k // 4,
                         with_payload=True,
                     )
@@ -386,11 +442,15 @@ class SafetyRetriever:
                 if len(term) < 3:
                     continue
                 try:
-                    results = client.scroll(
+                    results = await client.scroll(
                         collection_name=collection_name,
-                        scroll_filter={
-                            "must": [{"key": "page_content", "match": {"text": term}}]
-                        },
+                        scroll_filter=Filter(
+                            must=[
+                                FieldCondition(
+                                    key="page_content", match=MatchText(text=term)
+                                )
+                            ]
+                        ),
                         limit=k // 4,
                         with_payload=True,
                     )
@@ -415,29 +475,152 @@ class SafetyRetriever:
             logger.warning(f"Text match failed: {e}")
             return []
 
+    async def _collection_count(self) -> int:
+        """
+        Number of points in the collection, cached per process
+
+        Refreshed after collection_count_ttl seconds or when the corpus
+        version changes (document upload/delete), so fresh uploads are seen
+        immediately by this process.
+        """
+        collection_name = self.vector_store.collection_name
+        version = get_corpus_version()
+        now = time.monotonic()
+
+        cached = _collection_counts.get(collection_name)
+        if cached and cached[0] == version and cached[1] > now:
+            return cached[2]
+
+        # Exact: an estimate can read 0 or undercount right after an upsert,
+        # clamping fetch_k too far (the count is cached, so this is cheap)
+        result = await self.async_client.count(collection_name, exact=True)
+        _collection_counts[collection_name] = (
+            version,
+            now + self.settings.collection_count_ttl,
+            result.count,
+        )
+        return result.count
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, reusing embeddings already computed for any collection"""
+        embed_documents = self.vector_store.embeddings.aembed_documents
+        if not self.settings.query_cache_enabled:
+            return await embed_documents(queries)
+        return await get_query_embedding_cache().embed(queries, embed_documents)
+
+    async def _clamp_fetch_k(self, fetch_k: int) -> int:
+        """Clamp candidate count to collection size (no-op if count fails)"""
+        try:
+            return min(fetch_k, await self._collection_count())
+        except Exception as e:
+            logger.warning(f"Collection count failed: {e}")
+            return fetch_k
+
+    def _points_to_documents(self, points) -> List[Document]:
+        """Convert scored points (langchain_qdrant payload layout) to Documents"""
+        return [
+            Document(
+                page_content=point.payload.get("page_content", ""),
+                metadata={
+                    **point.payload.get("metadata", {}),
+                    "_id": point.id,
+                    "_collection_name": self.vector_store.collection_name,
+                    "score": point.score,
+                },
+            )
+            for point in points
+        ]
+
     async def retrieve_with_score(
-        self, query: str, k: int = 5, score_threshold: Optional[float] = None
+        self,
+        query: str,
+        k: int = 5,
+        score_threshold: Optional[float] = None,
+        query_vector: Optional[List[float]] = None,
     ) -> List[Document]:
         """
         Retrieve with similarity scores and store them in document metadata
 
         Optionally filter by minimum score threshold
+
+        Queries Qdrant directly with query_points so only payloads (no
+        vectors) travel over the wire for the fetch_k candidates.
+
+        Args:
+            query_vector: Precomputed query embedding; the query is embedded
+                here only when not provided
         """
-        # Use similarity_search_with_score to get scores
-        if score_threshold:
-            results = await self.vector_store.asimilarity_search_with_score(
-                query, k=k, score_threshold=score_threshold
-            )
-        else:
-            results = await self.vector_store.asimilarity_search_with_score(query, k=k)
+        if query_vector is None:
+            query_vector = (await self.embed_queries([query]))[0]
+        response = await self.async_client.query_points(
+            collection_name=self.vector_store.collection_name,
+            query=query_vector,
+            limit=k,
+            score_threshold=score_threshold or None,
+            with_payload=True,
+            with_vectors=False,
+            search_params=self.search_params,
+        )
 
         # Store scores in document metadata
-        docs_with_scores = []
-        for doc, score in results:
-            doc.metadata["score"] = score
-            docs_with_scores.append(doc)
+        return self._points_to_documents(response.points)
 
-        return docs_with_scores
+    async def retrieve_by_vectors(
+        self,
+        query_vectors: List[List[float]],
+        k: int = 5,
+        score_threshold: Optional[float] = None,
+    ) -> List[List[Document]]:
+        """
+        Similarity search for several query vectors in one round-trip
+
+        Uses Qdrant query_batch_points so N queries cost a single request.
+
+        Returns:
+            One list of scored documents per query vector (same order)
+        """
+        from qdrant_client.models import QueryRequest
+
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.vector_store.collection_name,
+            requests=[
+                QueryRequest(
+                    query=query_vector,
+                    limit=k,
+                    score_threshold=score_threshold or None,
+                    params=self.search_params,
+                    with_payload=True,
+                    with_vector=False,
+                )
+                for query_vector in query_vectors
+            ],
+        )
+        return [self._points_to_documents(response.points) for response in responses]
+
+    def _vector_ranking_is_confident(self, candidates: List[Document], k: int) -> bool:
+        """
+        Check whether vector scores already separate the top k clearly
+
+        Candidates come back from Qdrant sorted by cosine similarity. When
+        the k-th result beats the (k+1)-th by at least rerank_skip_margin,
+        or the top-1 result beats it by more than rerank_skip_gap (an
+        unambiguous match), the rerank round-trip can be skipped. Used by
+        retrieve_with_rerank and, for vector-only candidates, by
+        _retrieve_hybrid.
+        """
+        if len(candidates) <= k:
+            return False
+
+        top_score = candidates[0].metadata.get("score", 0)
+        kth_score = candidates[k - 1].metadata.get("score", 0)
+        cutoff_score = candidates[k].metadata.get("score", 0)
+
+        margin = self.settings.rerank_skip_margin
+        if margin > 0 and kth_score - cutoff_score >= margin:
+            return True
+
+        gap = self.settings.rerank_skip_gap
+        return gap > 0 and top_score - cutoff_score > gap
 
     async def retrieve_with_rerank(
         self,
@@ -460,54 +643,120 @@ class SafetyRetriever:
         Returns:
             Reranked top_k documents filtered by score threshold
         """
+        # Read before searching: results computed across an upload/delete
+        # must not be cached under the new corpus version
+        version = get_corpus_version()
+        exact_cache = (
+            get_exact_query_cache() if self.settings.query_cache_enabled else None
+        )
+        cache_key = make_query_key(
+            query,
+            "rerank",
+            self.vector_store.collection_name,
+            k,
+            fetch_k,
+            model,
+            rerank_score_threshold,
+        )
+        if exact_cache is not None:
+            cached_docs = exact_cache.get(cache_key)
+            if cached_docs is not None:
+                return cached_docs
+
+        # Embed once: the same vector probes the semantic cache and Qdrant
+        query_vector = (await self.embed_queries([query]))[0]
+        semantic_cache = (
+            get_query_cache(self.vector_store.collection_name)
+            if self.settings.query_cache_enabled
+            and self.settings.semantic_query_cache_enabled
+            else None
+        )
+        cache_params = ("rerank", k, fetch_k, model, rerank_score_threshold)
+        if semantic_cache is not None:
+            cached_docs = semantic_cache.get(query_vector, cache_params)
+            if cached_docs is not None:
+                exact_cache.put(cache_key, cached_docs, version)
+                return cached_docs
+
+        docs, degraded = await self._retrieve_with_rerank(
+            query, k, fetch_k, model, rerank_score_threshold, query_vector
+        )
+        # Rerank-failure fallbacks are returned but not cached
+        if degraded:
+            return docs
+        if semantic_cache is not None:
+            semantic_cache.put(query_vector, docs, cache_params, version)
+        if exact_cache is not None:
+            exact_cache.put(cache_key, docs, version)
+        return docs
+
+    async def _retrieve_with_rerank(
+        self,
+        query: str,
+        k: int,
+        fetch_k: int,
+        model: str,
+        rerank_score_threshold: float,
+        query_vector: Optional[List[float]] = None,
+    ) -> Tuple[List[Document], bool]:
+        """Uncached two-stage retrieval behind retrieve_with_rerank
+
+        Returns:
+            (documents, degraded) - degraded is True when the rerank failed
+            and the documents are the similarity fallback
+        """
         # Stage 1: Coarse ranking - retrieve candidates with similarity search
-        candidates = await self.retrieve_with_score(query, k=fetch_k)
+        # Small collections can't fill fetch_k; if they hold <= k points the
+        # rerank below is skipped anyway
+        fetch_k = await self._clamp_fetch_k(fetch_k)
+        if fetch_k == 0:
+            return [], False
+        candidates = await self.retrieve_with_score(
+            query, k=fetch_k, query_vector=query_vector
+        )
 
         if not self.reranker or len(candidates) <= k:
             # No reranker or insufficient candidates, return as-is
-            return candidates[:k]
+            return candidates[:k], False
+
+        if self._vector_ranking_is_confident(candidates, k):
+            # Clear cut between top k and the rest, keep similarity order
+            return candidates[:k], False
 
         # Stage 2: Fine ranking - rerank with Rerank model
         try:
             # Extract document content
             documents_text = [doc.page_content for doc in candidates]
 
-            # Import settings for top_n multiplier
-            from app.core.config import get_settings
-
-            settings = get_settings()
-
             # Call Rerank API
-            rerank_response = self.reranker.rerank(
+            rerank_response = await self.reranker.rerank(
                 model=model,
                 query=query,
                 documents=documents_text,
-                top_n=k * settings.rerank_top_n_multiplier,
+                top_n=k * self.settings.rerank_top_n_multiplier,
             )
 
             # Filter by rerank score threshold and reorder
             reranked_docs = []
             for result in rerank_response.results:
-                # Only keep documents above threshold
-                if (
-                    hasattr(result, "relevance_score")
-                    and result.relevance_score >= rerank_score_threshold
-                ):
+                score = getattr(result, "relevance_score", None)
+                if score is None:
+                    # Fallback: if no score attribute, keep all (backwards compatibility)
+                    reranked_docs.append(candidates[result.index])
+                elif score >= rerank_score_threshold:
+                    # Only keep documents above threshold
                     doc = candidates[result.index]
                     # Store rerank score in metadata for later use
-                    doc.metadata["score"] = result.relevance_score
+                    doc.metadata["score"] = score
                     reranked_docs.append(doc)
-                elif not hasattr(result, "relevance_score"):
-                    # Fallback: if no score attribute, keep all (backwards compatibility)
-                    reranked_docs.append(candidates[result.index])
 
             # Return top k from filtered results
-            return reranked_docs[:k]
+            return reranked_docs[:k], False
 
         except Exception as e:
             # Fallback: if rerank fails, return similarity results
             logger.warning(f"Rerank failed: {e}, falling back to similarity")
-            return candidates[:k]
+            return candidates[:k], True
 
     async def retrieve_with_fallback(
         self,
@@ -529,9 +778,303 @@ class SafetyRetriever:
             k: Number of documents to return
             score_threshold: Minimum similarity score for retrieval
         """
-        from app.core.config import get_settings
+        results = await self.retrieve_batch([query], k, score_threshold)
+        return results[0]
+
+    async def retrieve_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        score_threshold: float = 0.65,
+    ) -> List[List[Document]]:
+        """
+        Hybrid retrieval (see retrieve_with_fallback) for several queries
+
+        All queries are embedded in one call and the vector search for every
+        query not served by the semantic cache goes out as a single Qdrant
+        batch request; keyword matching and rerank then run concurrently.
+
+        Returns:
+            One list of documents per query (same order)
+        """
+        if not queries:
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in queries]
+        await self._retrieve_batch(queries, k, score_threshold, futures)
+        return [future.result() for future in futures]
+
+    def start_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        score_threshold: float = 0.65,
+    ) -> List[asyncio.Future]:
+        """
+        Start retrieve_batch in the background, one future per query
+
+        Each future resolves as soon as its own query's documents are ready
+        (cache hit, or its keyword match + rerank finished), so callers can
+        start downstream work per query instead of waiting for the slowest.
+
+        Returns:
+            One future of List[Document] per query (same order)
+        """
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in queries]
+        for future in futures:
+            # Mark failures as retrieved even if the caller stopped waiting
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if queries:
+            task = asyncio.create_task(
+                self._retrieve_batch(queries, k, score_threshold, futures)
+            )
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return futures
 
-        settings = get_settings()
+    async def _retrieve_batch(
+        self,
+        queries: List[str],
+        k: int,
+        score_threshold: float,
+        futures: List[asyncio.Future],
+    ) -> None:
+        """retrieve_batch body, resolving futures[i] once query i is done"""
+        results: List[Optional[List[Document]]] = [None] * len(queries)
+
+        def resolve(i: int, docs: List[Document]) -> None:
+            results[i] = docs
+            if not futures[i].done():
+                futures[i].set_result(docs)
+
+        try:
+            await self._retrieve_batch_tiers(
+                queries, k, score_threshold, results, resolve
+            )
+        except BaseException as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(
+                        e
+                        if isinstance(e, Exception)
+                        else RuntimeError("Batch retrieval cancelled")
+                    )
+            if not isinstance(e, Exception):
+                raise
+
+    async def _retrieve_batch_tiers(
+        self,
+        queries: List[str],
+        k: int,
+        score_threshold: float,
+        results: List[Optional[List[Document]]],
+        resolve: Callable[[int, List[Document]], None],
+    ) -> None:
+        collection_name = self.vector_store.collection_name
+        cache_params = (k, score_threshold)
+        # Read before any lookup or search: results computed across an
+        # upload/delete must not be cached under the new corpus version
+        version = get_corpus_version()
+        started_at = time.time()
+
+        # Tier 1: exact-match cache on normalized query text (no embedding)
+        exact_cache = (
+            get_exact_query_cache() if self.settings.query_cache_enabled else None
+        )
+        exact_keys = [
+            make_query_key(query, "hybrid", collection_name, *cache_params)
+            for query in queries
+        ]
+        if exact_cache is not None:
+            for i, key in enumerate(exact_keys):
+                docs = exact_cache.get(key)
+                if docs is not None:
+                    resolve(i, docs)
+
+        pending = [i for i, docs in enumerate(results) if docs is None]
+        if not pending:
+            return
+
+        # Empty collection: nothing to embed, search or rerank
+        fetch_k = await self._clamp_fetch_k(k * self.settings.fetch_k_multiplier)
+        if fetch_k == 0:
+            for i in pending:
+                resolve(i, [])
+            return
+
+        async def retrieve_hybrid(i: int, **kwargs) -> Tuple[List[Document], bool]:
+            docs, degraded = await self._retrieve_hybrid_bounded(
+                queries[i], k, score_threshold, **kwargs
+            )
+            resolve(i, docs)
+            return docs, degraded
+
+        try:
+            query_vectors = await self.embed_queries([queries[i] for i in pending])
+        except Exception as e:
+            logger.warning(f"Query embedding failed: {e}")
+            await asyncio.gather(*(retrieve_hybrid(i) for i in pending))
+            return
+        vector_by_index = dict(zip(pending, query_vectors))
+
+        # Semantic tiers: near-identical queries reuse previous results. Keyword
+        # matching tells apart queries that embed close together ("第5条" /
+        # "第6条", "安全帽" / "安全带"), so a hit also needs the same keywords
+        semantic_params = {
+            i: (*cache_params, self._keyword_signature(queries[i])) for i in pending
+        }
+
+        # Tier 2: in-process semantic cache
+        semantic_cache = (
+            get_query_cache(collection_name)
+            if self.settings.query_cache_enabled
+            and self.settings.semantic_query_cache_enabled
+            else None
+        )
+        if semantic_cache is not None:
+            for i in pending:
+                docs = semantic_cache.get(vector_by_index[i], semantic_params[i])
+                if docs is not None:
+                    exact_cache.put(exact_keys[i], docs, version)
+                    resolve(i, docs)
+
+        misses = [i for i in pending if results[i] is None]
+        if not misses:
+            return
+
+        # Tier 3: persistent cache shared across workers (one batched lookup)
+        persistent_cache = get_persistent_query_cache()
+        if persistent_cache is not None:
+            try:
+                cached_per_miss = await persistent_cache.get_many(
+                    collection_name,
+                    [vector_by_index[i] for i in misses],
+                    [("hybrid", *semantic_params[i]) for i in misses],
+                )
+            except Exception as e:
+                logger.warning(f"Persistent query cache lookup failed: {e}")
+                cached_per_miss = [None] * len(misses)
+
+            for i, docs in zip(misses, cached_per_miss):
+                if docs is not None:
+                    if semantic_cache is not None:
+                        semantic_cache.put(
+                            vector_by_index[i], docs, semantic_params[i], version
+                        )
+                    exact_cache.put(exact_keys[i], docs, version)
+                    resolve(i, docs)
+
+            misses = [i for i in misses if results[i] is None]
+            if not misses:
+                return
+
+        # One batched vector search for all cache misses
+        search_failed = False
+        try:
+            vector_candidates = await self.retrieve_by_vectors(
+                [vector_by_index[i] for i in misses],
+                k=fetch_k,
+            )
+        except Exception as e:
+            logger.warning(f"Vector search failed: {e}")
+            vector_candidates = [[] for _ in misses]
+            search_failed = True
+
+        # Each query resolves as soon as its own keyword match + rerank is done
+        outcomes = await asyncio.gather(
+            *(
+                retrieve_hybrid(i, vector_candidates=candidates)
+                for i, candidates in zip(misses, vector_candidates)
+            )
+        )
+
+        # Degraded results (vector search or rerank failed) are returned but
+        # not cached, so a transient error isn't served after recovery
+        cacheable = [
+            (i, docs)
+            for i, (docs, degraded) in zip(misses, outcomes)
+            if not (search_failed or degraded)
+        ]
+        for i, docs in cacheable:
+            if semantic_cache is not None:
+                semantic_cache.put(
+                    vector_by_index[i], docs, semantic_params[i], version
+                )
+            if exact_cache is not None:
+                exact_cache.put(exact_keys[i], docs, version)
+
+        if persistent_cache is not None and cacheable:
+            try:
+                await persistent_cache.put_many(
+                    collection_name,
+                    [exact_keys[i] for i, _ in cacheable],
+                    [vector_by_index[i] for i, _ in cacheable],
+                    [docs for _, docs in cacheable],
+                    [("hybrid", *semantic_params[i]) for i, _ in cacheable],
+                    version,
+                    started_at,
+                )
+            except Exception as e:
+                logger.warning(f"Persistent query cache store failed: {e}")
+
+    def prefetch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        score_threshold: float = 0.65,
+    ) -> asyncio.Task:
+        """
+        Start hybrid retrieval for expected queries in the background
+
+        Results land in the query caches, so a later retrieve_batch /
+        retrieve_with_fallback with the same (or near-identical) queries and
+        parameters is served without embedding, search or rerank. Useful for
+        sequential flows (e.g. video frames) where the next queries are
+        predictable from the previous ones. Failures are only logged.
+
+        Returns:
+            Background task (awaiting it is optional)
+        """
+        task = asyncio.create_task(self._prefetch(queries, k, score_threshold))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return task
+
+    async def _prefetch(
+        self, queries: List[str], k: int, score_threshold: float
+    ) -> None:
+        try:
+            await self.retrieve_batch(queries, k, score_threshold)
+        except Exception as e:
+            logger.warning(f"Prefetch failed: {e}")
+
+    async def _retrieve_hybrid_bounded(
+        self, *args, **kwargs
+    ) -> Tuple[List[Document], bool]:
+        """_retrieve_hybrid limited to max_retrieval_concurrency at a time"""
+        async with self._retrieval_semaphore:
+            return await self._retrieve_hybrid(*args, **kwargs)
+
+    async def _retrieve_hybrid(
+        self,
+        query: str,
+        k: int,
+        score_threshold: float,
+        vector_candidates: Optional[List[Document]] = None,
+    ) -> Tuple[List[Document], bool]:
+        """Uncached hybrid retrieval behind retrieve_with_fallback
+
+        Args:
+            vector_candidates: Precomputed vector search results; searched
+                here when not provided
+
+        Returns:
+            (documents, degraded) - degraded is True when a search or the
+            rerank failed and the documents come from a fallback
+        """
+        degraded = False
 
         # Step 1: Extract structured keywords for text matching
         extracted_keywords = self._extract_keywords(query)
@@ -561,44 +1104,58 @@ class SafetyRetriever:
                         all_candidates.append(doc)
             except Exception as e:
                 logger.warning(f"Keyword search failed: {e}")
+                degraded = True
 
         # 2b: Vector similarity search (supplements keyword matching)
-        try:
-            fetch_k = k * settings.fetch_k_multiplier
-            vector_candidates = await self.retrieve_with_score(query, k=fetch_k)
-            for doc in vector_candidates:
-                content_hash = hash(doc.page_content[:200])
-                if content_hash not in seen_contents:
-                    seen_contents.add(content_hash)
-                    all_candidates.append(doc)
-        except Exception as e:
-            logger.warning(f"Vector search failed: {e}")
+        if vector_candidates is None:
+            try:
+                fetch_k = await self._clamp_fetch_k(
+                    k * self.settings.fetch_k_multiplier
+                )
+                vector_candidates = await self.retrieve_with_score(query, k=fetch_k)
+            except Exception as e:
+                logger.warning(f"Vector search failed: {e}")
+                vector_candidates = []
+                degraded = True
+
+        keyword_count = len(all_candidates)
+        for doc in vector_candidates:
+            content_hash = hash(doc.page_content[:200])
+            if content_hash not in seen_contents:
+                seen_contents.add(content_hash)
+                all_candidates.append(doc)
 
         if not all_candidates:
-            return []
+            return [], degraded
+
+        # Vector-only candidates keep Qdrant's similarity order; when it
+        # already separates the top k clearly, skip the rerank round-trip
+        if keyword_count == 0 and self._vector_ranking_is_confident(
+            all_candidates, k
+        ):
+            return all_candidates[:k], degraded
 
         # Step 3: Rerank combined candidates
         if self.reranker and len(all_candidates) > k:
             try:
                 documents_text = [doc.page_content for doc in all_candidates]
 
-                rerank_response = self.reranker.rerank(
+                rerank_response = await self.reranker.rerank(
                     model="/model/bge-reranker-v2-m3",
                     query=query,
                     documents=documents_text,
-                    top_n=k * settings.rerank_top_n_multiplier,
+                    top_n=k * self.settings.rerank_top_n_multiplier,
                 )
 
                 reranked_docs = []
                 doc_article_matches = []  # Separate list for exact doc+article matches
 
+                threshold = self.settings.rerank_score_threshold
                 for result in rerank_response.results:
-                    if (
-                        hasattr(result, "relevance_score")
-                        and result.relevance_score >= settings.rerank_score_threshold
-                    ):
+                    score = getattr(result, "relevance_score", None)
+                    if score is not None and score >= threshold:
                         doc = all_candidates[result.index]
-                        doc.metadata["score"] = result.relevance_score
+                        doc.metadata["score"] = score
 
                         # Prioritize doc+article exact matches
                         if doc.metadata.get("match_type") == "doc_article":
@@ -608,12 +1165,16 @@ class SafetyRetriever:
 
                 # Put doc+article matches first, then other reranked docs
                 final_docs = doc_article_matches + reranked_docs
-                return final_docs[:k]
+                return final_docs[:k], degraded
 
             except Exception as e:
                 logger.warning(f"Rerank failed: {e}, using combined candidates")
+                degraded = True
 
         # Fallback: return top candidates by original score
-        return sorted(
-            all_candidates, key=lambda d: d.metadata.get("score", 0), reverse=True
-        )[:k]
+        return (
+            sorted(
+                all_candidates, key=lambda d: d.metadata.get("score", 0), reverse=True
+            )[:k],
+            degraded,
+        )
@@ -4,9 +4,17 @@ Main FastAPI application
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from app.core.config import get_settings
-from app.core.deps import ensure_collection, get_qdrant_client
+from app.core.deps import (
+    ensure_collection,
+    ensure_query_cache_collection,
+    warmup_collections,
+    get_qdrant_client,
+    get_async_qdrant_client,
+    get_http_async_client,
+)
 from app.core.logger import logger  # Initialize logger
 from app.api.routes import documents, analysis
 from app.api import qa
@@ -17,9 +25,13 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler"""
     # Startup: ensure all collections exist
     ensure_collection("all")  # Create both regulations and hazard_db collections
+    ensure_query_cache_collection()  # Persistent query cache (if enabled)
+    warmup_collections()  # Page HNSW graphs into memory before serving traffic
     yield
     # Shutdown
     get_qdrant_client().close()
+    await get_async_qdrant_client().close()
+    await get_http_async_client().aclose()  # LLM, embedding and rerank pool
 
 
 def create_app() -> FastAPI:
@@ -31,6 +43,7 @@ def create_app() -> FastAPI:
         version=settings.app_version,
         description="AI-Powered Safety Hazard Detection using VLM + RAG",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,  # Faster JSON for report payloads
     )
 
     # Include routers
@@ -5,6 +5,28 @@ Pydantic schemas for API request/response models
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 
+from app.core.config import SETTINGS
+
+# Allowed values are fixed at startup, resolve them once at import
+_HAZARD_CATEGORIES = SETTINGS.hazard_categories_set
+_HAZARD_LEVELS = SETTINGS.hazard_levels_set
+
+
+def _validate_category(v: str) -> str:
+    if v not in _HAZARD_CATEGORIES:
+        raise ValueError(
+            f"hazard_category must be one of {SETTINGS.hazard_categories}, got '{v}'"
+        )
+    return v
+
+
+def _validate_level(v: str) -> str:
+    if v not in _HAZARD_LEVELS:
+        raise ValueError(
+            f"hazard_level must be one of {SETTINGS.hazard_levels}, got '{v}'"
+        )
+    return v
+
 
 class HazardList(BaseModel):
     """List of detected hazards from VLM analysis"""
@@ -40,26 +62,20 @@ class SafetyViolationLLM(BaseModel):
     @field_validator("hazard_category")
     @classmethod
     def validate_category(cls, v: str) -> str:
-        from app.core.config import get_settings
-
-        settings = get_settings()
-        if v not in settings.hazard_categories:
-            raise ValueError(
-                f"hazard_category must be one of {settings.hazard_categories}, got '{v}'"
-            )
-        return v
+        return _validate_category(v)
 
     @field_validator("hazard_level")
     @classmethod
     def validate_level(cls, v: str) -> str:
-        from app.core.config import get_settings
+        return _validate_level(v)
+
 
-        settings = get_settings()
-        if v not in settings.hazard_levels:
-            raise ValueError(
-                f"hazard_level must be one of {settings.hazard_levels}, got '{v}'"
-            )
-        return v
+class ViolationList(BaseModel):
+    """Violations for several hazards from a single LLM call"""
+
+    violations: List[SafetyViolationLLM] = Field(
+        description="One violation per hazard, hazard_id matching the hazard number"
+    )
 
 
 class SafetyViolation(BaseModel):
@@ -83,26 +99,12 @@ class SafetyViolation(BaseModel):
     @field_validator("hazard_category")
     @classmethod
     def validate_category(cls, v: str) -> str:
-        from app.core.config import get_settings
-
-        settings = get_settings()
-        if v not in settings.hazard_categories:
-            raise ValueError(
-                f"hazard_category must be one of {settings.hazard_categories}, got '{v}'"
-            )
-        return v
+        return _validate_category(v)
 
     @field_validator("hazard_level")
     @classmethod
     def validate_level(cls, v: str) -> str:
-        from app.core.config import get_settings
-
-        settings = get_settings()
-        if v not in settings.hazard_levels:
-            raise ValueError(
-                f"hazard_level must be one of {settings.hazard_levels}, got '{v}'"
-            )
-        return v
+        return _validate_level(v)
 
 
 class SafetyReport(BaseModel):
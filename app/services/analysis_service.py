@@ -9,28 +9,136 @@ Implements RAG following LangChain v1.0+ best practices:
 - Clear separation of concerns
 """
 
-import base64
 import asyncio
+import io
 import json
-from typing import List
+import re
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Tuple
 
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
 from fastapi import UploadFile, HTTPException, status
 from loguru import logger
+import openai
+import pybase64
 
-from app.core.deps import get_llm, get_vlm, get_vector_store
+from app.core.deps import get_llm, get_reranker_client, get_vlm, get_vector_store
 from app.core.config import get_settings
+from app.core.llm_cache import (
+    get_hazard_cache,
+    get_semantic_violation_cache,
+    get_violation_cache,
+    make_content_key,
+    make_messages_key,
+)
+from app.core.report_cache import get_report_cache, perceptual_hash
 from app.core.retrieval import SafetyRetriever
 from app.schemas.safety import (
     SafetyReport,
     SafetyViolation,
     SafetyViolationLLM,
     HazardList,
+    ViolationList,
     SourceReference,
 )
 
 
+# Whitespace and punctuation ignored when comparing hazard descriptions
+_HAZARD_NOISE_RE = re.compile(r"[\s,.;:!?，。、；：！？]+")
+
+
+def _normalize_hazard(hazard: str) -> str:
+    """Normalize hazard text for duplicate detection"""
+    return _HAZARD_NOISE_RE.sub("", hazard.lower())
+
+
+# rule_reference markers, each list matched in a single regex pass:
+# LLM reported no relevant regulations
+_NOT_FOUND_PATTERN = "未检索到|未找到|未查找到|检索失败"
+_NOT_FOUND_RE = re.compile(_NOT_FOUND_PATTERN)
+# hazards without usable regulations (not found, or generation failed)
+_IRRELEVANT_RE = re.compile(_NOT_FOUND_PATTERN + "|生成失败")
+# transient failures (report must not be cached)
+_FAILURE_RE = re.compile("检索失败|生成失败")
+
+
+def _report_variant(user_hazards: Optional[List[str]]) -> str:
+    """Report cache variant: the other input a report depends on"""
+    return make_content_key(*user_hazards) if user_hazards else ""
+
+
+def _is_relevant_violation(violation: SafetyViolation) -> bool:
+    """Check whether a violation is backed by retrieved regulations"""
+    return _IRRELEVANT_RE.search(violation.rule_reference) is None
+
+
+# Static VLM hazard extraction prompt, built once at import
+_HAZARD_SYSTEM_MESSAGE = SystemMessage(
+    content="""你是专业的安全检查员，严格识别图片中真实存在的安全隐患。
+
+【重要】如果图片中存在多个隐患，必须全部列出，不要遗漏！
+
+要求：
+1. 必须有清晰明确的视觉证据
+2. 禁止猜测或推测可能存在的隐患
+3. 只识别违反安全规范的明确行为或状态
+4. 每条隐患用精确语言描述（10-30字，包含具体细节）
+5. 按严重程度排序
+6. 返回 0-5 个最关键的隐患
+7. 【关键】识别所有可见的安全隐患，不要只返回最严重的一个
+
+如果图片中没有明确的安全隐患，返回空数组。
+请以JSON格式返回结果，结构为: {"hazards": ["隐患1", "隐患2", ...]}
+"""
+)
+_HAZARD_USER_TEXT = {"type": "text", "text": "请分析图片中的安全隐患："}
+
+# Violation generation prompt templates, compiled once per service.
+# System prompts contain no per-hazard fields, so every call shares a
+# byte-identical prefix (reusable by vLLM prefix caching / provider
+# context caching); score and confidence go in the human message.
+_VIOLATION_RULES = """输出字段（严格遵守长度限制）：
+1. hazard_description: 20-40字
+2. hazard_category: 必须精确选择：{categories_list}
+3. hazard_level: 必须精确选择：{levels_list}
+4. recommendations: ≤200字
+   - 文档有整改措施时用"[文档依据]"
+   - 否则用"[AI建议]"
+5. rule_reference: ≤300字
+   格式：《规范名》(编号) 第X条：核心要求(≤100字)
+   禁止输出冗长原文段落
+
+相关性判断：
+- 相关：文档有核心关键词+具体条款+场景匹配
+- 不相关：无关键词/场景不符/内容宽泛 → 返回"未检索到相关规范"
+- 分数<0.3时优先判断为不相关
+"""
+_VIOLATION_SYSTEM_TEMPLATE = "安全报告生成器。\n\n" + _VIOLATION_RULES
+_VIOLATION_HUMAN_TEMPLATE = """检索相似度: {max_score}，{confidence_level}。
+
+隐患: {hazard}
+
+文档: {context}
+
+来源: {sources}
+"""
+
+# Batched variant: all hazards of a batch in one prompt, one block each
+_VIOLATION_BATCH_SYSTEM_TEMPLATE = (
+    "安全报告生成器。为每个隐患分别输出一条记录，hazard_id 与隐患编号一致，"
+    "每个隐患只依据其自身的文档判断。\n\n" + _VIOLATION_RULES
+)
+_VIOLATION_BATCH_BLOCK_TEMPLATE = """### 隐患 {hazard_id}: {hazard}
+检索相似度: {max_score}，{confidence_level}
+
+文档: {context}
+
+来源: {sources}
+"""
+
+
 class AnalysisService:
     """
     Service for safety analysis using VLM and RAG
@@ -47,12 +155,13 @@ class AnalysisService:
         self.vlm = get_vlm()  # For image analysis (multimodal)
         self.settings = get_settings()
 
+        # Bounds in-flight LLM/VLM calls across all requests on this worker
+        self._llm_semaphore = asyncio.Semaphore(self.settings.llm_max_concurrency)
+
         # Load formatting constants from config
         self.MAX_DOC_LENGTH = self.settings.max_doc_length
         self.MAX_CONTEXT_LENGTH = self.settings.max_context_length
         # Initialize retriever with Rerank support
-        from app.core.deps import get_reranker_client
-
         # Primary retriever: regulations collection (PDF/Markdown/Word)
         self.regulations_retriever = SafetyRetriever(
             get_vector_store("regulations"), reranker_client=get_reranker_client()
@@ -66,19 +175,82 @@ class AnalysisService:
         # Backward compatibility
         self.retriever = self.regulations_retriever
 
+        # Fallback category/level for violations not generated by the LLM
+        self._default_category = (
+            self.settings.hazard_categories[-1]
+            if self.settings.hazard_categories
+            else "其他"
+        )
+        self._default_level = (
+            self.settings.hazard_levels[0] if self.settings.hazard_levels else "一般隐患"
+        )
+
+        # Violation prompts compiled once, config-only fields bound up front
+        prompt_options = {
+            "categories_list": "、".join(self.settings.hazard_categories),
+            "levels_list": "\n   ".join(self.settings.hazard_levels),
+        }
+        self._violation_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", _VIOLATION_SYSTEM_TEMPLATE),
+                ("human", _VIOLATION_HUMAN_TEMPLATE),
+            ]
+        ).partial(**prompt_options)
+        self._violation_batch_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", _VIOLATION_BATCH_SYSTEM_TEMPLATE),
+                ("human", "{hazards}"),
+            ]
+        ).partial(**prompt_options)
+        self._confidence_levels = {
+            "high": f"高置信度 (≥{self.settings.high_confidence_threshold})",
+            "medium": f"中等置信度 ({self.settings.medium_confidence_threshold}-{self.settings.high_confidence_threshold})",
+            "low": f"较低置信度 ({self.settings.min_retrieval_score}-{self.settings.medium_confidence_threshold})",
+        }
+
         # Use text LLM for violation generation (RAG-based)
-        self.violation_llm = self.llm.with_structured_output(SafetyViolationLLM)
+        # Schema is converted once here and bound to the runnable. On vLLM,
+        # json_schema enables guided decoding so output always parses
+        # (no retries on malformed JSON); Aliyun keeps native function calling
+        violation_output = (
+            {"method": "function_calling"}
+            if self.settings.deployment_mode == "aliyun"
+            else {"method": "json_schema", "strict": True}
+        )
+        self.violation_llm = self.llm.with_structured_output(
+            SafetyViolationLLM, **violation_output
+        )
+        # All violations of a hazard batch in one call (batch_violation_generation)
+        self.violations_llm = self.llm.with_structured_output(
+            ViolationList, **violation_output
+        )
+
+        # VLM hazard extraction, built once (schema conversion is per-build)
+        # Aliyun supports native function calling; vLLM uses json_mode for
+        # compatibility without requiring --enable-auto-tool-choice
+        self.hazard_vlm = self.vlm.with_structured_output(
+            HazardList,
+            method=(
+                "function_calling"
+                if self.settings.deployment_mode == "aliyun"
+                else "json_mode"
+            ),
+        )
 
     async def analyze_image(
-        self, file: UploadFile, user_hazards: List[str] = None
+        self,
+        file: UploadFile,
+        user_hazards: List[str] = None,
+        prefetch_hazards: Optional[List[str]] = None,
     ) -> SafetyReport:
         """
         Analyze image for safety hazards using per-hazard retrieval
 
         Flow:
-        1. VLM extracts structured hazard list
+        1. VLM extracts structured hazard list (streamed)
         2. Merge with user-provided hazards (if any)
-        3. Each hazard independently retrieves relevant regulations
+        3. Each hazard independently retrieves relevant regulations, starting
+           as soon as the hazard is known (overlaps VLM generation)
         4. Each hazard generates individual SafetyViolation with specific rule_reference
         5. Combine all violations into final report
 
@@ -86,7 +258,138 @@ class AnalysisService:
             file: Uploaded image file
             user_hazards: Optional list of user-provided hazard descriptions.
                          If None or empty, only VLM hazards are used.
+            prefetch_hazards: Optional hazards expected in this image (e.g. the
+                previous video frame's); their retrieval runs while the VLM
+                is still extracting hazards
         """
+        image_bytes = await self._read_image(file)
+
+        # Step 0: Near-identical image already analyzed → reuse its report
+        phash, cached_report = await self._lookup_report(image_bytes, user_hazards)
+        if cached_report is not None:
+            return cached_report
+        self.prefetch(prefetch_hazards)
+
+        image_data_url = await self._encode_data_url(file.content_type, image_bytes)
+        violations = await self._analyze(image_data_url, user_hazards)
+
+        # Step 5: Filter out violations without relevant regulations
+        # Only keep hazards that have successfully retrieved relevant knowledge
+        filtered_violations = [v for v in violations if _is_relevant_violation(v)]
+
+        # Step 6: Reassign continuous hazard_id after filtering
+        # Ensure hazard_id is always sequential (1, 2, 3, ...) in final report
+        reindexed_violations = [
+            v.model_copy(update={"hazard_id": idx + 1})
+            for idx, v in enumerate(filtered_violations)
+        ]
+
+        # Step 7: Assemble final report
+        # If no valid violations found, return empty report
+        report = SafetyReport.model_construct(
+            violations=reindexed_violations,
+        )
+
+        self._store_report(phash, user_hazards, violations, report)
+        return report
+
+    async def analyze_image_stream(
+        self,
+        file: UploadFile,
+        user_hazards: List[str] = None,
+        prefetch_hazards: Optional[List[str]] = None,
+    ) -> AsyncIterator[SafetyViolation]:
+        """
+        Analyze image like analyze_image, yielding violations as they complete
+
+        The image is read and validated before returning, so invalid uploads
+        still fail with a normal HTTP error. Irrelevant violations are
+        filtered and hazard_id is assigned sequentially in emission order.
+
+        Returns:
+            Async iterator of SafetyViolation
+        """
+        image_bytes = await self._read_image(file)
+
+        # Same report cache as analyze_image: a hit replays its violations
+        phash, cached_report = await self._lookup_report(image_bytes, user_hazards)
+        if cached_report is not None:
+            return self._replay_violations(cached_report)
+        self.prefetch(prefetch_hazards)
+
+        image_data_url = await self._encode_data_url(file.content_type, image_bytes)
+        return self._stream_violations(image_data_url, user_hazards, phash)
+
+    async def _replay_violations(
+        self, report: SafetyReport
+    ) -> AsyncIterator[SafetyViolation]:
+        for violation in report.violations:
+            yield violation
+
+    async def _stream_violations(
+        self,
+        image_data_url: str,
+        user_hazards: Optional[List[str]],
+        phash: Optional[int] = None,
+    ) -> AsyncIterator[SafetyViolation]:
+        queue: asyncio.Queue = asyncio.Queue()
+        analysis = asyncio.create_task(
+            self._analyze(image_data_url, user_hazards, queue)
+        )
+        analysis.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            emitted = []
+            while (violation := await queue.get()) is not None:
+                if _is_relevant_violation(violation):
+                    violation = violation.model_copy(
+                        update={"hazard_id": len(emitted) + 1}
+                    )
+                    emitted.append(violation)
+                    yield violation
+            violations = await analysis  # Propagate analysis errors
+        finally:
+            analysis.cancel()
+
+        report = SafetyReport.model_construct(violations=emitted)
+        self._store_report(phash, user_hazards, violations, report)
+
+    async def _lookup_report(
+        self, image_bytes: memoryview, user_hazards: Optional[List[str]]
+    ) -> Tuple[Optional[int], Optional[SafetyReport]]:
+        """
+        Look up the report cache for an image
+
+        Returns:
+            (phash, cached report) - phash is None when the cache is disabled
+            or hashing failed, the report is None on a miss
+        """
+        report_cache = get_report_cache()
+        if report_cache is None:
+            return None, None
+        try:
+            phash = await asyncio.to_thread(perceptual_hash, image_bytes)
+        except Exception as e:
+            logger.warning(f"Perceptual hash failed, skipping report cache: {e}")
+            return None, None
+        return phash, report_cache.get(phash, _report_variant(user_hazards))
+
+    def _store_report(
+        self,
+        phash: Optional[int],
+        user_hazards: Optional[List[str]],
+        violations: List[SafetyViolation],
+        report: SafetyReport,
+    ) -> None:
+        """Cache a finished report unless any violation hit a transient failure"""
+        # Don't pin transient retrieval/LLM failures into the cache
+        if phash is not None and not any(
+            _FAILURE_RE.search(v.rule_reference) for v in violations
+        ):
+            get_report_cache().put(phash, report, _report_variant(user_hazards))
+
+    async def _read_image(self, file: UploadFile) -> memoryview:
+        """Validate uploaded image and read its content"""
         # Validate file type
         if not file.content_type or not file.content_type.startswith("image/"):
             raise HTTPException(
@@ -94,17 +397,105 @@ class AnalysisService:
                 detail="Invalid file type. Only images are supported",
             )
 
-        # Read and validate file size
-        image_bytes = await file.read()
-        if len(image_bytes) > self.settings.max_file_size:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File too large",
-            )
+        # Read in chunks, rejecting oversized files as soon as the limit is hit
+        image_buffer = io.BytesIO()
+        while chunk := await file.read(self.settings.upload_chunk_size):
+            image_buffer.write(chunk)
+            if image_buffer.tell() > self.settings.max_file_size:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="File too large",
+                )
+        return image_buffer.getbuffer()
+
+    async def _encode_data_url(self, content_type: str, image_bytes: memoryview) -> str:
+        """Encode image content as a base64 data URL"""
+        # Build the data URL as bytes and decode once; label with the real
+        # content type (JPEG sent as image/png is rejected by some VLMs)
+        prefix = f"data:{content_type};base64,".encode("ascii")
+        if image_bytes.nbytes > self.settings.image_encode_offload_size:
+            # Large images: encode off the event loop so other requests' I/O
+            # isn't stalled (pybase64 releases the GIL)
+            encoded = await asyncio.to_thread(pybase64.b64encode, image_bytes)
+        else:
+            encoded = pybase64.b64encode(image_bytes)
+        return (prefix + encoded).decode("ascii")
+
+    async def _analyze(
+        self,
+        image_data_url: str,
+        user_hazards: Optional[List[str]],
+        queue: Optional[asyncio.Queue] = None,
+    ) -> List[SafetyViolation]:
+        """
+        Run hazard extraction, retrieval and violation generation
 
-        # Step 1: Extract structured hazard list using VLM
-        image_b64 = base64.b64encode(image_bytes).decode()
-        vlm_hazards = await self._extract_hazards_as_list(image_b64)
+        Retrieval and generation for each hazard start as soon as it is
+        known - user hazards right away, VLM hazards while the VLM is still
+        generating.
+
+        Args:
+            queue: If given, each violation is also put here when generated
+
+        Returns:
+            Unfiltered violations in hazard order (user hazards first,
+            duplicates removed)
+        """
+        # Step 1: Extract structured hazard list using VLM (streamed)
+        # Duplicate hazards (same text up to case/whitespace/punctuation,
+        # e.g. user hazard repeated by the VLM) are analyzed only once
+        hazard_tasks = []
+        seen_hazards = set()
+        unique_count = 0
+        # Batch generation needs the whole hazard list in one call, so
+        # hazards are buffered until the VLM stream ends
+        batch_mode = self.settings.batch_violation_generation
+        pending_hazards: List[str] = []
+
+        def start(hazards: List[str]) -> None:
+            nonlocal unique_count
+            unique_hazards = []
+            for hazard in hazards:
+                key = _normalize_hazard(hazard)
+                if key and key not in seen_hazards:
+                    seen_hazards.add(key)
+                    unique_hazards.append(hazard)
+            if batch_mode:
+                pending_hazards.extend(unique_hazards)
+            elif unique_hazards:
+                hazard_tasks.append(
+                    asyncio.create_task(
+                        self._analyze_hazards(unique_hazards, unique_count + 1, queue)
+                    )
+                )
+                unique_count += len(unique_hazards)
+
+        if user_hazards:
+            start(user_hazards)
+
+        vlm_hazards = []
+        try:
+            # aclosing: release the VLM slot promptly if analysis is cancelled
+            async with aclosing(self._stream_hazards(image_data_url)) as stream:
+                async for new_hazards in stream:
+                    vlm_hazards.extend(new_hazards)
+                    start(new_hazards)
+        except BaseException:
+            for task in hazard_tasks:
+                task.cancel()
+            raise
+
+        if pending_hazards:
+            # Small batches gain little over per-hazard calls, which stream
+            # and fail independently
+            if len(pending_hazards) >= max(
+                2, self.settings.batch_violation_min_hazards
+            ):
+                analysis = self._analyze_hazards_batched(pending_hazards, queue)
+            else:
+                analysis = self._analyze_hazards(pending_hazards, 1, queue)
+            hazard_tasks.append(asyncio.create_task(analysis))
+            unique_count = len(pending_hazards)
 
         # Step 2: Merge user-provided hazards with VLM-detected hazards
         # Treat None and empty list as equivalent (no user hazards)
@@ -119,133 +510,166 @@ class AnalysisService:
             logger.info(f"VLM识别结果: hazards={vlm_hazards}")
             logger.info(f"识别到的隐患数量: {len(hazards_list)}")
 
-        # If no hazards detected (neither user nor VLM), return empty report
-        if not hazards_list:
-            return SafetyReport(violations=[])
+        if unique_count < len(hazards_list):
+            logger.info(f"去重后的隐患数量: {unique_count}")
 
-        # Step 3: Batch retrieve documents for each hazard (parallel)
-        docs_per_hazard = await self._batch_retrieve_per_hazard(hazards_list)
+        # If no hazards detected (neither user nor VLM), nothing to generate
+        if not hazard_tasks:
+            return []
 
-        # Step 4: Generate violations for each hazard (parallel)
-        violation_tasks = [
-            self._generate_single_violation(hazard, docs, i + 1)
-            for i, (hazard, docs) in enumerate(zip(hazards_list, docs_per_hazard))
+        # Steps 3-4: Collect per-hazard violations (same order as hazards)
+        return [
+            violation
+            for task_violations in await asyncio.gather(*hazard_tasks)
+            for violation in task_violations
         ]
-        violations = await asyncio.gather(*violation_tasks)
 
-        # Step 5: Filter out violations without relevant regulations
-        # Only keep hazards that have successfully retrieved relevant knowledge
-        filtered_violations = [
-            v
-            for v in violations
-            if not any(
-                keyword in v.rule_reference
-                for keyword in [
-                    "未检索到",
-                    "未找到",
-                    "未查找到",
-                    "检索失败",
-                    "生成失败",
-                ]
+    async def _analyze_hazards(
+        self,
+        hazards: List[str],
+        first_hazard_id: int,
+        queue: Optional[asyncio.Queue] = None,
+    ) -> List[SafetyViolation]:
+        """
+        Retrieve documents for hazards, then generate their violations
+
+        Retrieval is batched across hazards, but each hazard's generation
+        starts as soon as its own documents are ready (no barrier between
+        retrieval and generation).
+        """
+        regulations_futures = self.regulations_retriever.start_batch(
+            hazards,
+            k=self.settings.regulations_retrieval_k,
+            score_threshold=self.settings.regulations_score_threshold,
+        )
+        hazard_db_futures = self.hazard_db_retriever.start_batch(
+            hazards,
+            k=self.settings.hazard_db_retrieval_k,
+            score_threshold=self.settings.hazard_db_score_threshold,
+        )
+
+        async def generate(i: int) -> SafetyViolation:
+            regulations_docs = await regulations_futures[i]
+            # hazard_db is only needed when regulations are insufficient
+            if self._regulations_sufficient(regulations_docs):
+                docs = regulations_docs
+            else:
+                docs = self._combine_docs(
+                    regulations_docs, await hazard_db_futures[i]
+                )
+            violation = await self._generate_single_violation(
+                hazards[i], docs, first_hazard_id + i
             )
-        ]
+            if queue is not None:
+                queue.put_nowait(violation)
+            return violation
 
-        # Step 6: Reassign continuous hazard_id after filtering
-        # Ensure hazard_id is always sequential (1, 2, 3, ...) in final report
-        reindexed_violations = [
-            v.model_copy(update={"hazard_id": idx + 1})
-            for idx, v in enumerate(filtered_violations)
-        ]
+        return await asyncio.gather(*(generate(i) for i in range(len(hazards))))
 
-        # Step 7: Assemble final report
-        # If no valid violations found, return empty report
-        report = SafetyReport(
-            violations=reindexed_violations,
-        )
+    async def _analyze_hazards_batched(
+        self, hazards: List[str], queue: Optional[asyncio.Queue] = None
+    ) -> List[SafetyViolation]:
+        """Retrieve documents for all hazards, then generate violations in one call"""
+        docs_per_hazard = await self._batch_retrieve_per_hazard(hazards)
+        violations = await self._generate_violations_batch(hazards, docs_per_hazard, 1)
+        if queue is not None:
+            for violation in violations:
+                queue.put_nowait(violation)
+        return violations
 
-        return report
+    def prefetch(self, hazards: Optional[List[str]]) -> List[asyncio.Task]:
+        """
+        Warm retrieval caches for hazards expected in an upcoming analysis
+
+        For sequential analysis (e.g. consecutive video frames) pass the
+        previous frame's hazards; the next analyze_image call then reuses
+        the cached documents instead of waiting on Qdrant and rerank.
 
-    async def _extract_hazards_as_list(self, image_b64: str) -> List[str]:
+        Returns:
+            Background prefetch tasks, one per collection (none when there
+            is nothing to prefetch or query caching is disabled)
         """
-        Extract hazards from image as structured list using VLM
+        if not hazards or not self.settings.query_cache_enabled:
+            return []
+        return [
+            self.regulations_retriever.prefetch(
+                hazards,
+                k=self.settings.regulations_retrieval_k,
+                score_threshold=self.settings.regulations_score_threshold,
+            ),
+            self.hazard_db_retriever.prefetch(
+                hazards,
+                k=self.settings.hazard_db_retrieval_k,
+                score_threshold=self.settings.hazard_db_score_threshold,
+            ),
+        ]
+
+    async def _stream_hazards(self, image_data_url: str) -> AsyncIterator[List[str]]:
+        """
+        Extract hazards from image using VLM, yielding them as they complete
 
         Uses with_structured_output for compatibility with both vLLM and Aliyun API:
         - Aliyun mode: Uses native function_calling
         - Local vLLM mode: Uses json_mode (no special vLLM flags required)
 
-        Returns list of hazard descriptions (e.g., ["未佩戴安全帽", "高空作业无安全带"])
+        The structured output is streamed as growing partial HazardList
+        objects. A hazard is complete once a later one has started, the
+        last one when the stream ends.
+
+        Yields lists of newly completed hazard descriptions
+        (e.g., ["未佩戴安全帽"], then ["高空作业无安全带"])
         """
         messages = [
-            SystemMessage(
-                content="""你是专业的安全检查员，严格识别图片中真实存在的安全隐患。
-
-【重要】如果图片中存在多个隐患，必须全部列出，不要遗漏！
-
-要求：
-1. 必须有清晰明确的视觉证据
-2. 禁止猜测或推测可能存在的隐患
-3. 只识别违反安全规范的明确行为或状态
-4. 每条隐患用精确语言描述（10-30字，包含具体细节）
-5. 按严重程度排序
-6. 返回 0-5 个最关键的隐患
-7. 【关键】识别所有可见的安全隐患，不要只返回最严重的一个
-
-如果图片中没有明确的安全隐患，返回空数组。
-请以JSON格式返回结果，结构为: {"hazards": ["隐患1", "隐患2", ...]}
-"""
-            ),
+            _HAZARD_SYSTEM_MESSAGE,
             HumanMessage(
                 content=[
-                    {
-                        "type": "text",
-                        "text": "请分析图片中的安全隐患：",
-                    },
+                    _HAZARD_USER_TEXT,
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{image_b64}"},
+                        "image_url": {"url": image_data_url},
                     },
                 ]
             ),
         ]
 
+        # Identical image → identical hazards (temperature 0), skip the VLM
+        hazard_cache = get_hazard_cache()
+        cache_key = make_content_key(image_data_url)
+        if hazard_cache is not None:
+            cached_hazards = hazard_cache.get(cache_key)
+            if cached_hazards is not None:
+                logger.info(f"Hazard cache hit: {list(cached_hazards)}")
+                if cached_hazards:
+                    yield list(cached_hazards)
+                return
+
+        emitted = 0
+        hazards: List[str] = []
         try:
-            # Use with_structured_output with json_mode for better compatibility
-            # This works with both vLLM and Aliyun API without requiring
-            # --enable-auto-tool-choice flag
-            settings = get_settings()
-
-            # Check deployment mode to choose appropriate method
-            if settings.deployment_mode == "aliyun":
-                # Aliyun supports native function calling
-                vlm_structured = self.vlm.with_structured_output(
-                    HazardList, method="function_calling"
-                )
-            else:
-                # vLLM: use json_mode for better compatibility
-                vlm_structured = self.vlm.with_structured_output(
-                    HazardList, method="json_mode"
-                )
-
-            result = await vlm_structured.ainvoke(messages)
-            logger.debug(f"VLM response: {result}")
-
-            # Extract hazards from structured output
-            if isinstance(result, HazardList):
-                hazards = result.hazards
-                logger.info(f"Extracted {len(hazards)} hazards: {hazards}")
-                return hazards
-
-            # Fallback
-            logger.warning("Unexpected response format, returning empty list")
-            return []
+            async with self._llm_semaphore:
+                async for partial in self.hazard_vlm.astream(messages):
+                    if not isinstance(partial, HazardList):
+                        continue
+                    hazards = partial.hazards
+                    # All but the last hazard are final (the last may still grow)
+                    if len(hazards) - 1 > emitted:
+                        yield hazards[emitted:-1]
+                        emitted = len(hazards) - 1
 
         except Exception as e:
-            logger.error(f"Error in _extract_hazards_as_list: {str(e)}")
+            logger.error(f"Error in _stream_hazards: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"VLM 隐患提取失败: {str(e)}",
             )
 
+        logger.debug(f"VLM response: {hazards}")
+        logger.info(f"Extracted {len(hazards)} hazards: {hazards}")
+        if hazard_cache is not None:
+            hazard_cache.put(cache_key, tuple(hazards))
+        if len(hazards) > emitted:
+            yield hazards[emitted:]
+
     async def _batch_retrieve_per_hazard(
         self, hazards_list: List[str]
     ) -> List[List[Document]]:
@@ -255,39 +679,69 @@ class AnalysisService:
         2. Fallback: hazard_db collection (Excel) - only if regulations insufficient
 
         This ensures Excel data doesn't pollute regulation-based retrieval
-        """
-        all_results = []
 
-        for hazard in hazards_list:
-            # Step 1: Try regulations collection first (higher quality)
-            regulations_docs = await self.regulations_retriever.retrieve_with_fallback(
-                hazard,
+        Each collection is queried once for all hazards (batched embedding
+        and vector search). Both collections are queried concurrently;
+        hazard_db results are only used where regulations are insufficient.
+        """
+        regulations_results, hazard_db_results = await asyncio.gather(
+            # Primary: regulations collection (higher quality)
+            self.regulations_retriever.retrieve_batch(
+                hazards_list,
                 k=self.settings.regulations_retrieval_k,
                 score_threshold=self.settings.regulations_score_threshold,
-            )
-
-            # Step 2: Check if regulations results are sufficient
-            # If we have enough high-quality docs, use them directly
-            if (
-                regulations_docs
-                and len(regulations_docs)
-                >= self.settings.regulations_min_sufficient_docs
-            ):
-                all_results.append(regulations_docs)
-                continue
-
-            # Step 3: Regulations insufficient - supplement with hazard_db
-            hazard_db_docs = await self.hazard_db_retriever.retrieve_with_fallback(
-                hazard,
+            ),
+            # Supplementary: hazard_db collection
+            self.hazard_db_retriever.retrieve_batch(
+                hazards_list,
                 k=self.settings.hazard_db_retrieval_k,
                 score_threshold=self.settings.hazard_db_score_threshold,
+            ),
+        )
+
+        return [
+            (
+                regulations_docs
+                if self._regulations_sufficient(regulations_docs)
+                else self._combine_docs(regulations_docs, hazard_db_docs)
             )
+            for regulations_docs, hazard_db_docs in zip(
+                regulations_results, hazard_db_results
+            )
+        ]
 
-            # Combine: regulations (higher priority) + hazard_db (supplementary)
-            combined_docs = regulations_docs + hazard_db_docs
-            all_results.append(combined_docs[: self.settings.max_combined_docs])
+    def _regulations_sufficient(self, regulations_docs: List[Document]) -> bool:
+        """Check whether regulations alone give enough high-quality docs"""
+        return (
+            bool(regulations_docs)
+            and len(regulations_docs) >= self.settings.regulations_min_sufficient_docs
+        )
 
-        return all_results
+    def _combine_docs(
+        self, regulations_docs: List[Document], hazard_db_docs: List[Document]
+    ) -> List[Document]:
+        """Combine regulations (higher priority) with hazard_db (supplementary)"""
+        combined_docs = regulations_docs + hazard_db_docs
+        return combined_docs[: self.settings.max_combined_docs]
+
+    @staticmethod
+    def _document_location(metadata: dict) -> str:
+        """Build human-readable location of a chunk within its source file"""
+        sheet = metadata.get("sheet_name")
+        # Excel: prefer row_range (batch), fallback to row_number (legacy)
+        row_info = metadata.get("row_range") or metadata.get("row_number")
+        if sheet and row_info:
+            return f"工作表: {sheet}, 行: {row_info}"
+
+        page = metadata.get("page")
+        if page is not None:
+            # PDF page metadata uses 0-based indexing, convert to 1-based for display
+            return f"页码: {page + 1}"
+
+        section = metadata.get("section")
+        if section:
+            return f"章节: {section}"
+        return "位置未知"
 
     def _format_documents(self, docs: List[Document]) -> dict:
         """
@@ -305,59 +759,209 @@ class AnalysisService:
                 "has_high_confidence": False,
             }
 
-        context_parts = []
-        sources = set()  # Use set for automatic deduplication
-        source_refs = []  # Structured source references
-        scores = []  # Collect similarity scores
-
-        for i, doc in enumerate(docs, 1):
-            # Extract similarity score from metadata
-            score = doc.metadata.get("score", 0.0)
-            scores.append(score)
-
-            # Truncate content to avoid token limits
-            content = doc.page_content[: self.MAX_DOC_LENGTH]
-            # Add score indicator to context
-            context_parts.append(f"[文档{i}] (相似度分数: {score:.3f})\n{content}")
-
-            # Collect unique source files and structured references
-            filename = doc.metadata.get("filename", "未知来源")
-            sheet = doc.metadata.get("sheet_name")
-            row_range = doc.metadata.get("row_range")  # New: batch row range
-            row = doc.metadata.get("row_number")  # Old: single row (fallback)
-            page = doc.metadata.get("page")
-            section = doc.metadata.get("section")
-
-            # Build location string
-            if sheet and (row_range or row):
-                # Excel: prefer row_range (batch), fallback to row_number (legacy)
-                row_info = row_range if row_range else f"{row}"
-                location = f"工作表: {sheet}, 行: {row_info}"
-            elif page is not None:
-                # PDF page metadata uses 0-based indexing, convert to 1-based for display
-                location = f"页码: {page + 1}"
-            elif section:
-                location = f"章节: {section}"
-            else:
-                location = "位置未知"
+        scores = [doc.metadata.get("score", 0.0) for doc in docs]
+        max_score = max(scores)
 
-            # Add to text sources
-            location_suffix = f" ({location})" if location != "位置未知" else ""
-            sources.add(f"- {filename}{location_suffix}")
-
-            # Add to structured source references
-            source_refs.append(SourceReference(filename=filename, location=location))
+        # Structured source references for all documents (API response);
+        # fields are plain strings we built, skip validation
+        source_refs = [
+            SourceReference.model_construct(
+                filename=doc.metadata.get("filename", "未知来源"),
+                location=self._document_location(doc.metadata),
+            )
+            for doc in docs
+        ]
 
-        max_score = max(scores) if scores else 0.0
+        # Prompt only gets the best documents above the relevance floor;
+        # the LLM is told to ignore low scores, so they'd be wasted tokens
+        prompt_items = sorted(
+            (
+                item
+                for item in zip(scores, docs, source_refs)
+                if item[0] >= self.settings.min_retrieval_score
+            ),
+            key=lambda item: item[0],
+            reverse=True,
+        )[: self.settings.max_prompt_docs]
+
+        # Share the MAX_CONTEXT_LENGTH budget across prompt documents: each
+        # gets an even share of what's left (capped at MAX_DOC_LENGTH), so a
+        # long first document can't crowd out the rest and short documents
+        # pass their unused share on
+        context_parts = []
+        remaining = self.MAX_CONTEXT_LENGTH
+        for i, (score, doc, _) in enumerate(prompt_items, 1):
+            header = f"[文档{i}] (相似度分数: {score:.3f})\n"
+            share = remaining // (len(prompt_items) - i + 1)
+            content_length = max(0, min(self.MAX_DOC_LENGTH, share - len(header)))
+            part = header + doc.page_content[:content_length]
+            context_parts.append(part)
+            remaining -= len(part) + 5  # len("\n---\n")
+
+        # Unique source lines of prompt documents, in prompt document order
+        # (already sorted by score, so the prompt stays stable for caching)
+        sources = dict.fromkeys(
+            (
+                f"- {ref.filename} ({ref.location})"
+                if ref.location != "位置未知"
+                else f"- {ref.filename}"
+            )
+            for _, _, ref in prompt_items
+        )
 
         return {
             "context": "\n---\n".join(context_parts),
-            "sources": "\n".join(sorted(sources)),  # Sort for consistency
+            "sources": "\n".join(sources),
             "source_refs": source_refs,  # Structured references for API response
             "max_score": max_score,  # Maximum similarity score for objective judgment
             "has_high_confidence": max_score >= 0.7,  # High confidence threshold
         }
 
+    async def _hazard_vector(self, hazard: str) -> Optional[List[float]]:
+        """Embedding of a hazard (normally already cached by retrieval)"""
+        try:
+            return (await self.regulations_retriever.embed_queries([hazard]))[0]
+        except Exception as e:
+            logger.warning(f"Hazard embedding failed, skipping semantic cache: {e}")
+            return None
+
+    @staticmethod
+    def _max_score(docs: List[Document]) -> float:
+        """Highest retrieval score among docs (0.0 if none)"""
+        return max((doc.metadata.get("score", 0.0) for doc in docs), default=0.0)
+
+    def _low_score_violation(
+        self, hazard: str, hazard_id: int, max_score: float
+    ) -> SafetyViolation:
+        """Build "no relevant regulations" violation for low retrieval scores"""
+        return SafetyViolation.model_construct(
+            hazard_id=hazard_id,
+            hazard_description=hazard,
+            hazard_category=self._default_category,
+            hazard_level=self._default_level,
+            recommendations="建议咨询安全专家获取专业整改意见",
+            rule_reference=f"未检索到相关规范（检索相似度过低: {max_score:.3f}）",
+            source_documents=[],
+        )
+
+    def _confidence_level(self, max_score: float) -> str:
+        """Build confidence guidance based on score"""
+        if max_score >= self.settings.high_confidence_threshold:
+            return self._confidence_levels["high"]
+        elif max_score >= self.settings.medium_confidence_threshold:
+            return self._confidence_levels["medium"]
+        return self._confidence_levels["low"]
+
+    def _to_violation(
+        self, llm_violation: SafetyViolationLLM, hazard_id: int, formatted: dict
+    ) -> SafetyViolation:
+        """Convert LLM output into a complete SafetyViolation"""
+        # Only add source_documents if LLM finds relevant regulations
+        # Check if rule_reference indicates "no relevant regulations found"
+        is_relevant = _NOT_FOUND_RE.search(llm_violation.rule_reference) is None
+
+        # Standardize "not found" message format with similarity score
+        rule_reference = llm_violation.rule_reference
+        if not is_relevant:
+            # Replace generic message with score-enriched format for consistency
+            rule_reference = f"未检索到相关规范（检索相似度: {formatted['max_score']:.3f}，LLM判断不相关）"
+
+        # Convert to complete SafetyViolation and add source_documents only if relevant
+        # Fields were validated on SafetyViolationLLM already, skip re-validation
+        return SafetyViolation.model_construct(
+            hazard_id=hazard_id,
+            hazard_description=llm_violation.hazard_description,
+            hazard_category=llm_violation.hazard_category,
+            hazard_level=llm_violation.hazard_level,
+            recommendations=llm_violation.recommendations,
+            rule_reference=rule_reference,
+            source_documents=(formatted.get("source_refs", []) if is_relevant else []),
+        )
+
+    async def _generate_violations_batch(
+        self,
+        hazards: List[str],
+        docs_per_hazard: List[List[Document]],
+        first_hazard_id: int,
+    ) -> List[SafetyViolation]:
+        """
+        Generate violations for several hazards with a single LLM call
+
+        Low-score hazards are short-circuited as in _generate_single_violation.
+        Hazards missing from the batch output (or all of them, if the batch
+        call fails) fall back to per-hazard generation.
+
+        Returns:
+            Violations in hazard order
+        """
+        formatted_list: List[Optional[dict]] = [None] * len(hazards)
+        violations: List[Optional[SafetyViolation]] = [None] * len(hazards)
+
+        blocks = []
+        for i, (hazard, docs) in enumerate(zip(hazards, docs_per_hazard)):
+            max_score = self._max_score(docs)
+            if max_score < self.settings.min_retrieval_score:
+                violations[i] = self._low_score_violation(
+                    hazard, first_hazard_id + i, max_score
+                )
+                continue
+            formatted = formatted_list[i] = self._format_documents(docs)
+            blocks.append(
+                _VIOLATION_BATCH_BLOCK_TEMPLATE.format(
+                    hazard_id=first_hazard_id + i,
+                    hazard=hazard,
+                    max_score=f"{max_score:.3f}",
+                    confidence_level=self._confidence_level(max_score),
+                    context=formatted["context"],
+                    sources=formatted["sources"],
+                )
+            )
+
+        # A single pending hazard gains nothing from batching
+        if len(blocks) > 1:
+            messages = self._violation_batch_prompt.format_messages(
+                hazards="\n".join(blocks)
+            )
+            try:
+                violation_cache = get_violation_cache()
+                cache_key = make_messages_key(messages)
+                result = (
+                    violation_cache.get(cache_key)
+                    if violation_cache is not None
+                    else None
+                )
+                if result is None:
+                    async with self._llm_semaphore:
+                        result = await self.violations_llm.ainvoke(messages)
+                    if violation_cache is not None:
+                        violation_cache.put(cache_key, result)
+
+                by_id = {v.hazard_id: v for v in result.violations}
+                for i, formatted in enumerate(formatted_list):
+                    llm_violation = by_id.get(first_hazard_id + i)
+                    if violations[i] is None and llm_violation is not None:
+                        violations[i] = self._to_violation(
+                            llm_violation, first_hazard_id + i, formatted
+                        )
+            except Exception as e:
+                logger.warning(
+                    f"批量生成违规记录失败，回退为逐条生成 ({len(blocks)} 条): {e}"
+                )
+
+        missing = [i for i, violation in enumerate(violations) if violation is None]
+        if missing:
+            generated = await asyncio.gather(
+                *(
+                    self._generate_single_violation(
+                        hazards[i], docs_per_hazard[i], first_hazard_id + i
+                    )
+                    for i in missing
+                )
+            )
+            for i, violation in zip(missing, generated):
+                violations[i] = violation
+        return violations
+
     async def _generate_single_violation(
         self, hazard: str, docs: List[Document], hazard_id: int
     ) -> SafetyViolation:
@@ -367,141 +971,81 @@ class AnalysisService:
         This ensures each hazard has precise rule_reference from relevant docs
         Uses hard threshold (0.4) to filter low-quality retrievals objectively
         """
-        formatted = self._format_documents(docs)
-
         # Hard threshold check: if retrieval score below minimum, directly return as irrelevant
         # This prevents LLM from trying to extract rules from low-quality matches
-        if formatted["max_score"] < self.settings.min_retrieval_score:
-            default_category = (
-                self.settings.hazard_categories[-1]
-                if self.settings.hazard_categories
-                else "其他"
-            )
-            default_level = (
-                self.settings.hazard_levels[0]
-                if self.settings.hazard_levels
-                else "一般隐患"
-            )
-            return SafetyViolation(
-                hazard_id=hazard_id,
-                hazard_description=hazard,
-                hazard_category=default_category,
-                hazard_level=default_level,
-                recommendations="建议咨询安全专家获取专业整改意见",
-                rule_reference=f"未检索到相关规范（检索相似度过低: {formatted['max_score']:.3f}）",
-                source_documents=[],
-            )
-
-        # Get hazard classification settings from config
-        categories_list = "、".join(self.settings.hazard_categories)
-        levels_list = "\n   ".join(self.settings.hazard_levels)
+        # (checked on raw scores, so rejected hazards skip formatting too)
+        max_score = self._max_score(docs)
+        if max_score < self.settings.min_retrieval_score:
+            return self._low_score_violation(hazard, hazard_id, max_score)
 
-        # Build confidence guidance based on score
-        max_score = formatted["max_score"]
-        if max_score >= self.settings.high_confidence_threshold:
-            confidence_level = f"高置信度 (≥{self.settings.high_confidence_threshold})"
-            confidence_guidance = "文档很可能与隐患直接相关，仔细提取规范条款"
-        elif max_score >= self.settings.medium_confidence_threshold:
-            confidence_level = f"中等置信度 ({self.settings.medium_confidence_threshold}-{self.settings.high_confidence_threshold})"
-            confidence_guidance = "文档可能相关，需仔细判断关键词匹配度和场景一致性"
-        else:
-            confidence_level = f"较低置信度 ({self.settings.min_retrieval_score}-{self.settings.medium_confidence_threshold})"
-            confidence_guidance = (
-                "文档相关性存疑，务必严格检查关键词和场景匹配，谨慎引用"
-            )
-
-        messages = [
-            SystemMessage(
-                content=f"""安全报告生成器。检索相似度: {max_score:.3f}，{confidence_level}。
-
-输出字段（严格遵守长度限制）：
-1. hazard_description: 20-40字
-2. hazard_category: 必须精确选择：{categories_list}
-3. hazard_level: 必须精确选择：{levels_list}
-4. recommendations: ≤200字
-   - 文档有整改措施时用"[文档依据]"
-   - 否则用"[AI建议]"
-5. rule_reference: ≤300字
-   格式：《规范名》(编号) 第X条：核心要求(≤100字)
-   禁止输出冗长原文段落
-
-相关性判断：
-- 相关：文档有核心关键词+具体条款+场景匹配
-- 不相关：无关键词/场景不符/内容宽泛 → 返回"未检索到相关规范"
-- 分数<0.3时优先判断为不相关
-"""
-            ),
-            HumanMessage(
-                content=f"""隐患: {hazard}
-
-文档: {formatted['context'][:self.MAX_CONTEXT_LENGTH]}
+        formatted = self._format_documents(docs)
 
-来源: {formatted['sources']}
-"""
-            ),
-        ]
+        # Only per-request fields are filled; config fields were bound in __init__
+        messages = self._violation_prompt.format_messages(
+            max_score=f"{max_score:.3f}",
+            confidence_level=self._confidence_level(max_score),
+            hazard=hazard,
+            context=formatted["context"],
+            sources=formatted["sources"],
+        )
 
         try:
             # LLM generates SafetyViolationLLM (without source_documents)
-            llm_violation = await self.violation_llm.ainvoke(messages)
-
-            # Only add source_documents if LLM finds relevant regulations
-            # Check if rule_reference indicates "no relevant regulations found"
-            is_relevant = not any(
-                keyword in llm_violation.rule_reference
-                for keyword in ["未检索到", "未找到", "未查找到", "检索失败"]
+            # Same hazard + same retrieved docs → same prompt, reuse response
+            violation_cache = get_violation_cache()
+            cache_key = make_messages_key(messages)
+            llm_violation = (
+                violation_cache.get(cache_key) if violation_cache is not None else None
             )
 
-            # Standardize "not found" message format with similarity score
-            rule_reference = llm_violation.rule_reference
-            if not is_relevant:
-                # Replace generic message with score-enriched format for consistency
-                rule_reference = f"未检索到相关规范（检索相似度: {formatted['max_score']:.3f}，LLM判断不相关）"
-
-            # Convert to complete SafetyViolation and add source_documents only if relevant
-            violation = SafetyViolation(
-                hazard_id=hazard_id,
-                hazard_description=llm_violation.hazard_description,
-                hazard_category=llm_violation.hazard_category,
-                hazard_level=llm_violation.hazard_level,
-                recommendations=llm_violation.recommendations,
-                rule_reference=rule_reference,
-                source_documents=(
-                    formatted.get("source_refs", []) if is_relevant else []
+            # Differently worded but near-identical hazard with the same
+            # retrieved docs (e.g. "未戴安全帽" / "未佩戴安全帽") → reuse too
+            semantic_cache = get_semantic_violation_cache()
+            hazard_vector = None
+            if llm_violation is None and semantic_cache is not None:
+                group_key = make_content_key(formatted["context"], formatted["sources"])
+                hazard_vector = await self._hazard_vector(hazard)
+                if hazard_vector is not None:
+                    llm_violation = semantic_cache.get(group_key, hazard_vector)
+
+            if llm_violation is None:
+                async with self._llm_semaphore:
+                    llm_violation = await self.violation_llm.ainvoke(messages)
+                if hazard_vector is not None:
+                    semantic_cache.put(group_key, hazard_vector, llm_violation)
+            if violation_cache is not None:
+                violation_cache.put(cache_key, llm_violation)
+
+            return self._to_violation(llm_violation, hazard_id, formatted)
+        # Transient API errors were already retried with backoff by the SDK
+        # (llm_max_retries); CancelledError is not an Exception and propagates
+        except openai.LengthFinishReasonError:
+            return self._failed_violation(
+                hazard,
+                hazard_id,
+                recommendations=(
+                    "[AI建议] 1. 立即停止作业并整改\n[AI建议] 2. 联系安全负责人检查\n[AI建议] 3. 符合规范后方可继续"
                 ),
+                rule_reference=f"未检索到相关规范（检索相似度: {max_score:.3f}，LLM生成失败: 输出超长度限制）",
             )
-            return violation
         except Exception as e:
-            # Unified error handling with fallback
-            error_msg = str(e)
-            is_token_limit = "length limit" in error_msg or "max_tokens" in error_msg
-
-            # Use default values from config
-            default_category = (
-                self.settings.hazard_categories[-1]
-                if self.settings.hazard_categories
-                else "其他"
-            )
-            default_level = (
-                self.settings.hazard_levels[0]
-                if self.settings.hazard_levels
-                else "一般隐患"
+            return self._failed_violation(
+                hazard,
+                hazard_id,
+                recommendations="[AI建议] 请咨询安全专家获取整改建议",
+                rule_reference=f"未检索到相关规范（检索相似度: {max_score:.3f}，LLM生成失败: {str(e)[:80]}）",
             )
 
-            return SafetyViolation(
-                hazard_id=hazard_id,
-                hazard_description=hazard,
-                hazard_category=default_category,
-                hazard_level=default_level,
-                recommendations=(
-                    "[AI建议] 1. 立即停止作业并整改\n[AI建议] 2. 联系安全负责人检查\n[AI建议] 3. 符合规范后方可继续"
-                    if is_token_limit
-                    else "[AI建议] 请咨询安全专家获取整改建议"
-                ),
-                rule_reference=(
-                    f"未检索到相关规范（检索相似度: {formatted['max_score']:.3f}，LLM生成失败: 输出超长度限制）"
-                    if is_token_limit
-                    else f"未检索到相关规范（检索相似度: {formatted['max_score']:.3f}，LLM生成失败: {error_msg[:80]}）"
-                ),
-                source_documents=[],  # Error case should not include source documents
-            )
+    def _failed_violation(
+        self, hazard: str, hazard_id: int, recommendations: str, rule_reference: str
+    ) -> SafetyViolation:
+        """Build fallback violation when LLM generation fails"""
+        return SafetyViolation.model_construct(
+            hazard_id=hazard_id,
+            hazard_description=hazard,
+            hazard_category=self._default_category,
+            hazard_level=self._default_level,
+            recommendations=recommendations,
+            rule_reference=rule_reference,
+            source_documents=[],  # Error case should not include source documents
+        )
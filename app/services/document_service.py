@@ -2,17 +2,29 @@
 Document processing service
 """
 
+import asyncio
 import tempfile
+import uuid
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Set
 
 from fastapi import UploadFile, HTTPException, status
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from langchain_core.documents import Document
+from loguru import logger
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    IsEmptyCondition,
+    MatchAny,
+    MatchValue,
+    PayloadField,
+    PointStruct,
+)
 
 from app.core.config import get_settings
-from app.core.deps import get_qdrant_client, get_embeddings, get_vector_store
+from app.core.deps import ensure_collection, get_async_qdrant_client, get_embeddings
+from app.core.query_cache import invalidate_collection
 from app.schemas.safety import DocumentDetail, DocumentInfo
 from app.services.processors import DocumentProcessorFactory
 
@@ -22,7 +34,7 @@ class DocumentService:
 
     def __init__(self):
         self.settings = get_settings()
-        self.client = get_qdrant_client()
+        self.client = get_async_qdrant_client()
         self.embeddings = get_embeddings()
 
     async def upload_documents(
@@ -46,21 +58,107 @@ class DocumentService:
                 detail=f"Too many files. Maximum {self.settings.max_files} files allowed",
             )
 
-        details = []
-        for file in files:
-            detail = await self._process_single_file(file, skip_existing, purpose)
-            details.append(detail)
+        # One lookup per collection instead of one scroll per file
+        existing = (
+            await self._existing_filenames(purpose, [file.filename for file in files])
+            if skip_existing
+            else None
+        )
+
+        # Files are independent and I/O-bound: process them concurrently,
+        # capped so parsing threads and embedding requests don't pile up
+        semaphore = asyncio.Semaphore(self.settings.max_upload_concurrency)
+
+        async def process_with_limit(file: UploadFile) -> DocumentDetail:
+            async with semaphore:
+                try:
+                    return await self._process_single_file(file, existing, purpose)
+                except Exception as e:
+                    return DocumentDetail(
+                        filename=file.filename,
+                        status="failed",
+                        message=f"Processing failed: {str(e)}",
+                    )
 
+        # Copies of the same filename in one upload run one after another:
+        # once a copy is indexed (or found), the rest are skipped
+        groups: Dict[str, List[int]] = {}
+        for i, file in enumerate(files):
+            groups.setdefault(file.filename if skip_existing else str(i), []).append(i)
+
+        details: List[Optional[DocumentDetail]] = [None] * len(files)
+
+        async def process_group(indices: List[int]) -> None:
+            for n, i in enumerate(indices):
+                details[i] = await process_with_limit(files[i])
+                if details[i].status in ("success", "skipped"):
+                    for j in indices[n + 1 :]:
+                        details[j] = DocumentDetail(
+                            filename=files[j].filename,
+                            status="skipped",
+                            message="Already exists",
+                        )
+                    return
+
+        await asyncio.gather(*(process_group(indices) for indices in groups.values()))
         return details
 
+    async def _existing_filenames(
+        self, purpose: str, filenames: List[str]
+    ) -> Dict[str, Set[str]]:
+        """Find which of the given filenames are already indexed
+
+        Args:
+            purpose: 'qa' or 'safety' (selects the candidate collections)
+            filenames: Filenames of the upload
+
+        Returns:
+            Mapping of collection name to the filenames it already contains
+        """
+        if purpose == "qa":
+            collections = [self.settings.qdrant_collection_qa]
+        else:
+            collections = [
+                self.settings.qdrant_collection_regulations,
+                self.settings.qdrant_collection_hazard_db,
+            ]
+
+        async def lookup(collection_name: str) -> Set[str]:
+            try:
+                # Facet on the metadata.filename index: one hit per indexed name
+                response = await self.client.facet(
+                    collection_name=collection_name,
+                    key="metadata.filename",
+                    facet_filter=Filter(
+                        must=[
+                            FieldCondition(
+                                key="metadata.filename",
+                                match=MatchAny(any=filenames),
+                            )
+                        ]
+                    ),
+                    limit=len(filenames),
+                )
+            except Exception:
+                # Missing collection (or lookup error): nothing to skip,
+                # _index_chunks recreates a missing collection
+                return set()
+            return {str(hit.value) for hit in response.hits}
+
+        results = await asyncio.gather(*(lookup(c) for c in collections))
+        return dict(zip(collections, results))
+
     async def _process_single_file(
-        self, file: UploadFile, skip_existing: bool, purpose: str = "safety"
+        self,
+        file: UploadFile,
+        existing: Optional[Dict[str, Set[str]]],
+        purpose: str = "safety",
     ) -> DocumentDetail:
         """Process a single file based on purpose
 
         Args:
             file: File to process
-            skip_existing: Skip if file already exists
+            existing: Already indexed filenames per collection (None: don't skip)
             purpose: 'qa' or 'safety'
         """
         # Get file extension
@@ -75,35 +173,84 @@ class DocumentService:
                 message=f"不支持的文件类型。支持: {', '.join(supported_exts)}",
             )
 
-        # Read file content
-        content = await file.read()
-        if len(content) > self.settings.max_file_size:
+        # Stream file content to disk in bounded chunks (never buffer whole file)
+        tmp_path = await self._save_upload_to_temp(file, file_ext)
+        if tmp_path is None:
             return DocumentDetail(
                 filename=file.filename, status="failed", message="文件过大"
             )
 
-        # Check if PDF is scanned (image-only, no extractable text)
-        if file_ext == ".pdf":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_check:
-                tmp_check.write(content)
-                tmp_check_path = tmp_check.name
+        try:
+            return await self._process_saved_file(
+                file.filename, tmp_path, file_ext, existing, purpose
+            )
+        finally:
+            Path(tmp_path).unlink(missing_ok=True)
 
-            try:
-                if self._is_scanned_pdf(tmp_check_path):
-                    return DocumentDetail(
-                        filename=file.filename,
-                        status="failed",
-                        message="检测到扫描版PDF，无法提取文本内容。请上传包含可提取文本的PDF文件。",
-                    )
-            finally:
-                Path(tmp_check_path).unlink(missing_ok=True)
+    async def _save_upload_to_temp(
+        self, file: UploadFile, suffix: str
+    ) -> Optional[str]:
+        """Stream an uploaded file to a temporary file chunk by chunk
+
+        Memory usage stays at O(upload_chunk_size) regardless of file size.
+
+        Args:
+            file: Uploaded file
+            suffix: Suffix for the temporary file (keeps extension for processors)
+
+        Returns:
+            Path of the temporary file, or None if the file exceeds max_file_size
+        """
+        chunk_size = self.settings.upload_chunk_size
+        total_size = 0
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            tmp_path = tmp.name
+            while chunk := await file.read(chunk_size):
+                total_size += len(chunk)
+                if total_size > self.settings.max_file_size:
+                    break
+                tmp.write(chunk)
+
+        if total_size > self.settings.max_file_size:
+            Path(tmp_path).unlink(missing_ok=True)
+            return None
+
+        return tmp_path
+
+    async def _process_saved_file(
+        self,
+        filename: str,
+        tmp_path: str,
+        file_ext: str,
+        existing: Optional[Dict[str, Set[str]]],
+        purpose: str = "safety",
+    ) -> DocumentDetail:
+        """Validate, route and index a file already saved to disk
+
+        Args:
+            filename: Original filename
+            tmp_path: Path of the saved temporary file
+            file_ext: Lower-cased file extension
+            existing: Already indexed filenames per collection (None: don't skip)
+            purpose: 'qa' or 'safety'
+        """
+        # Check if PDF is scanned (image-only, no extractable text)
+        if file_ext == ".pdf" and await asyncio.to_thread(
+            self._is_scanned_pdf, tmp_path
+        ):
+            return DocumentDetail(
+                filename=filename,
+                status="failed",
+                message="检测到扫描版PDF，无法提取文本内容。请上传包含可提取文本的PDF文件。",
+            )
 
         # Determine target collection based on purpose and file type
         if purpose == "qa":
             # QA system: all files go to qa collection
             if file_ext in [".xlsx", ".xls"]:
                 return DocumentDetail(
-                    filename=file.filename,
+                    filename=filename,
                     status="failed",
                     message="QA系统不支持 Excel 文件，请使用 PDF/Word/Markdown 格式",
                 )
@@ -116,54 +263,29 @@ class DocumentService:
                 target_collection = self.settings.qdrant_collection_regulations
         else:
             return DocumentDetail(
-                filename=file.filename,
+                filename=filename,
                 status="failed",
                 message=f"Invalid purpose: {purpose}. Must be 'qa' or 'safety'",
             )
 
         # Check if exists in the target collection (only if skip_existing is True)
-        if skip_existing:
-            try:
-                result = self.client.scroll(
-                    collection_name=target_collection,
-                    scroll_filter={
-                        "must": [
-                            {
-                                "key": "metadata.filename",
-                                "match": {"value": file.filename},
-                            }
-                        ]
-                    },
-                    limit=1,
-                    with_vectors=False,
-                )
-
-                # result is a tuple: (points, offset)
-                points = result[0]
-                if len(points) > 0:
-                    return DocumentDetail(
-                        filename=file.filename,
-                        status="skipped",
-                        message="Already exists",
-                    )
-            except Exception as e:
-                # Collection might not exist yet, that's OK - will be created during upload
-                # Or other errors during scroll - just continue with upload
-                pass
+        if existing is not None and filename in existing.get(target_collection, ()):
+            return DocumentDetail(
+                filename=filename,
+                status="skipped",
+                message="Already exists",
+            )
 
         # Process document
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-
         try:
             metadata = {
-                "filename": file.filename,
+                "filename": filename,
                 "upload_time": datetime.now().isoformat(),
             }
 
-            # Process the document
-            chunks = DocumentProcessorFactory.process(
+            # Process the document (CPU/disk bound, keep it off the event loop)
+            chunks = await asyncio.to_thread(
+                DocumentProcessorFactory.process,
                 tmp_path,
                 metadata,
                 self.settings.chunk_size,
@@ -173,7 +295,7 @@ class DocumentService:
             # Check if any chunks were generated
             if len(chunks) == 0:
                 return DocumentDetail(
-                    filename=file.filename,
+                    filename=filename,
                     status="failed",
                     chunks=0,
                     message="文件处理失败：未能提取有效/相关内容，请确保文件内容有效/相关。",
@@ -183,34 +305,83 @@ class DocumentService:
             collection_name = target_collection
 
             # Store in vector database (routed to appropriate collection)
-            QdrantVectorStore.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                url=self.settings.qdrant_url,
-                collection_name=collection_name,
-                force_recreate=False,
-            )
+            await self._index_chunks(chunks, collection_name)
 
             return DocumentDetail(
-                filename=file.filename,
+                filename=filename,
                 status="success",
                 chunks=len(chunks),
                 message="Uploaded successfully",
             )
         except ValueError as e:
             return DocumentDetail(
-                filename=file.filename,
+                filename=filename,
                 status="failed",
                 message=str(e),
             )
         except Exception as e:
             return DocumentDetail(
-                filename=file.filename,
+                filename=filename,
                 status="failed",
                 message=f"Processing failed: {str(e)}",
             )
+
+    async def _index_chunks(self, chunks: List[Document], collection_name: str):
+        """Embed chunks in batched calls and upsert them into Qdrant
+
+        All chunk texts are embedded with aembed_documents (batched by
+        embedding_batch_size per HTTP request) instead of one request per
+        chunk, then written with one upsert per batch. The payload layout
+        matches langchain_qdrant so QdrantVectorStore can read the points.
+
+        Args:
+            chunks: Processed document chunks
+            collection_name: Target Qdrant collection
+        """
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = await self.embeddings.aembed_documents(texts)
+
+        points = [
+            PointStruct(
+                id=uuid.uuid4().hex,
+                vector=vector,
+                payload={
+                    "page_content": chunk.page_content,
+                    "metadata": chunk.metadata,
+                },
+            )
+            for chunk, vector in zip(chunks, vectors)
+        ]
+
+        batch_size = self.settings.embedding_batch_size
+        written = False
+        try:
+            for start in range(0, len(points), batch_size):
+                await self._upsert(collection_name, points[start : start + batch_size])
+                written = True
         finally:
-            Path(tmp_path).unlink(missing_ok=True)
+            # Cached retrieval results may now be stale, also when a later
+            # batch failed after earlier ones were indexed
+            if written:
+                await invalidate_collection(collection_name)
+
+    async def _upsert(self, collection_name: str, points: List[PointStruct]):
+        """Upsert points, recreating the collection if it was dropped at runtime"""
+        try:
+            await self.client.upsert(collection_name=collection_name, points=points)
+        except Exception:
+            if await self.client.collection_exists(collection_name):
+                raise
+            collection_types = {
+                self.settings.qdrant_collection_regulations: "regulations",
+                self.settings.qdrant_collection_hazard_db: "hazard_db",
+                self.settings.qdrant_collection_qa: "qa",
+            }
+            logger.warning(f"Collection {collection_name} missing, recreating it")
+            await asyncio.to_thread(
+                ensure_collection, collection_types[collection_name]
+            )
+            await self.client.upsert(collection_name=collection_name, points=points)
 
     def _is_scanned_pdf(self, file_path: str, min_text_length: int = 50) -> bool:
         """检测PDF是否为扫描版（无可提取文本）
@@ -253,7 +424,7 @@ class DocumentService:
             # 这样可以避免处理损坏或格式异常的PDF
             return True
 
-    def list_documents(
+    async def list_documents(
         self, purpose: str = "safety", filename_search: str = None
     ) -> List[DocumentInfo]:
         """List all documents by purpose (non-paginated, kept for backward compatibility)
@@ -277,49 +448,68 @@ class DocumentService:
 
         for collection_name in collections:
             # Check if collection exists
-            try:
-                self.client.get_collection(collection_name)
-            except:
+            if not await self.client.collection_exists(collection_name):
                 continue
 
-            offset = None
-            while True:
-                points, offset = self.client.scroll(
-                    collection_name=collection_name,
-                    limit=1000,  # 使用更大的 limit 提高效率
-                    offset=offset,
-                    with_payload=True,
-                    with_vectors=False,
-                )
+            counts = await self._filename_counts(collection_name)
+            for filename, count in counts.items():
+                # Apply filename filter if provided (case-insensitive)
+                if filename_search and filename_search.lower() not in filename.lower():
+                    continue
 
-                if not points:
-                    break
-
-                for point in points:
-                    filename = point.payload.get("metadata", {}).get(
-                        "filename", "unknown"
-                    )
-
-                    # Apply filename filter if provided (case-insensitive)
-                    if (
-                        filename_search
-                        and filename_search.lower() not in filename.lower()
-                    ):
-                        continue
-
-                    all_docs.setdefault(filename, 0)
-                    all_docs[filename] += 1
-
-                # 继续获取直到 offset 为 None（表示没有更多数据）
-                if offset is None:
-                    break
+                all_docs[filename] = all_docs.get(filename, 0) + count
 
         return [
             DocumentInfo(filename=name, chunks_count=count)
             for name, count in all_docs.items()
         ]
 
-    def list_documents_paginated(
+    async def _filename_counts(self, collection_name: str) -> Dict[str, int]:
+        """Chunk count per filename of a collection
+
+        Computed server-side from the metadata.filename keyword index (no
+        scroll over every chunk). Facet has no offset, so further pages
+        exclude the filenames already seen. Chunks without a filename are
+        counted as "unknown".
+        """
+        limit = self.settings.qdrant_scroll_limit_large
+        counts: Dict[str, int] = {}
+        while True:
+            response = await self.client.facet(
+                collection_name=collection_name,
+                key="metadata.filename",
+                facet_filter=(
+                    Filter(
+                        must_not=[
+                            FieldCondition(
+                                key="metadata.filename",
+                                match=MatchAny(any=list(counts)),
+                            )
+                        ]
+                    )
+                    if counts
+                    else None
+                ),
+                limit=limit,
+                exact=True,
+            )
+            for hit in response.hits:
+                counts[str(hit.value)] = hit.count
+            if len(response.hits) < limit:
+                break
+
+        unnamed = await self.client.count(
+            collection_name=collection_name,
+            count_filter=Filter(
+                must=[IsEmptyCondition(is_empty=PayloadField(key="metadata.filename"))]
+            ),
+            exact=True,
+        )
+        if unnamed.count:
+            counts["unknown"] = counts.get("unknown", 0) + unnamed.count
+        return counts
+
+    async def list_documents_paginated(
         self,
         purpose: str = "safety",
         page: int = 1,
@@ -341,7 +531,7 @@ class DocumentService:
         import math
 
         # Get all documents first (using existing method with search filter)
-        all_documents = self.list_documents(purpose, filename_search)
+        all_documents = await self.list_documents(purpose, filename_search)
 
         # Calculate pagination
         total = len(all_documents)
@@ -361,7 +551,7 @@ class DocumentService:
             items=paginated_items,
         )
 
-    def delete_documents(
+    async def delete_documents(
         self, filenames: List[str], purpose: str = "safety"
     ) -> List[dict]:
         """Delete documents by filename based on purpose
@@ -389,22 +579,26 @@ class DocumentService:
 
             # Try deleting from both collections
             for collection_name in collections:
-                result = self.client.scroll(
+                # Exact count (a scroll capped at qdrant_scroll_limit_large
+                # would under-report large files)
+                result = await self.client.count(
                     collection_name=collection_name,
-                    scroll_filter={
-                        "must": [
-                            {"key": "metadata.filename", "match": {"value": filename}}
+                    count_filter=Filter(
+                        must=[
+                            FieldCondition(
+                                key="metadata.filename",
+                                match=MatchValue(value=filename),
+                            )
                         ]
-                    },
-                    limit=self.settings.qdrant_scroll_limit_large,
-                    with_vectors=False,
+                    ),
+                    exact=True,
                 )
 
-                if len(result[0]) > 0:
+                if result.count > 0:
                     found = True
-                    total_removed += len(result[0])
+                    total_removed += result.count
 
-                    self.client.delete(
+                    await self.client.delete(
                         collection_name=collection_name,
                         points_selector=Filter(
                             must=[
@@ -415,6 +609,8 @@ class DocumentService:
                             ]
                         ),
                     )
+                    # Cached retrieval results may reference deleted chunks
+                    await invalidate_collection(collection_name)
 
             if not found:
                 results.append({"filename": filename, "status": "not_found"})
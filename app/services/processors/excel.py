@@ -1,6 +1,7 @@
 """Excel document processors with optimized chunking"""
 
 from datetime import datetime
+from itertools import islice
 from typing import List, Dict, Any
 
 from langchain_core.documents import Document
@@ -42,20 +43,22 @@ class ExcelProcessor(DocumentProcessor):
         """
         settings = get_settings()
         rows_per_chunk = settings.excel_rows_per_chunk
-        key_fields = set(settings.excel_key_fields)
+        key_fields = settings.excel_key_fields_set
 
         wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
         documents = []
 
         for sheet_name in wb.sheetnames:
             ws = wb[sheet_name]
-            rows = list(ws.iter_rows(values_only=True))
+            # 流式读取行，避免整表加载到内存
+            rows = ws.iter_rows(values_only=True)
+            header_row = next(rows, None)
 
-            if not rows:
+            if header_row is None:
                 continue
 
             # 第一行作为表头
-            headers = [str(h).strip() if h else "" for h in rows[0]]
+            headers = [str(h).strip() if h else "" for h in header_row]
 
             # 过滤掉空表头
             non_empty_headers = [h for h in headers if h]
@@ -74,33 +77,37 @@ class ExcelProcessor(DocumentProcessor):
                 # If no key fields found, use all non-empty fields (fallback)
                 key_indices = [i for i, h in enumerate(headers) if h]
 
+            # Resolve (column, header) pairs once per sheet, not per cell
+            key_columns = [(i, headers[i]) for i in key_indices]
+
             # 批量处理数据行：每 N 行合并为一个 chunk
-            data_rows = rows[1:]
-            for batch_start in range(0, len(data_rows), rows_per_chunk):
-                batch_rows = data_rows[batch_start : batch_start + rows_per_chunk]
+            batch_start = 0
+            while batch_rows := list(islice(rows, rows_per_chunk)):
                 batch_texts = []
 
                 for row_offset, row in enumerate(batch_rows):
                     row_idx = (
                         batch_start + row_offset + 2
                     )  # +2 for header and 1-based index
+                    row_len = len(row)
                     row_data = []
 
                     # Only process key fields
-                    for idx in key_indices:
-                        if idx < len(row):
-                            header = headers[idx]
-                            value = row[idx]
-
-                            if header and value is not None:
-                                # 处理日期时间类型
-                                value_str = (
-                                    value.strftime("%Y-%m-%d %H:%M:%S")
-                                    if isinstance(value, datetime)
-                                    else str(value).strip()
-                                )
-                                if value_str:
-                                    row_data.append(f"{header}: {value_str}")
+                    for idx, header in key_columns:
+                        if idx >= row_len:
+                            continue
+                        value = row[idx]
+                        if value is None:
+                            continue
+
+                        # 处理日期时间类型
+                        value_str = (
+                            value.strftime("%Y-%m-%d %H:%M:%S")
+                            if isinstance(value, datetime)
+                            else str(value).strip()
+                        )
+                        if value_str:
+                            row_data.append(f"{header}: {value_str}")
 
                     if row_data:
                         batch_texts.append(f"第{row_idx}行 - {' | '.join(row_data)}")
@@ -109,9 +116,7 @@ class ExcelProcessor(DocumentProcessor):
                     # 合并多行为一个文档
                     combined_text = "\n".join(batch_texts)
                     row_range_start = batch_start + 2
-                    row_range_end = min(
-                        batch_start + rows_per_chunk + 1, len(data_rows) + 1
-                    )
+                    row_range_end = batch_start + len(batch_rows) + 1
 
                     doc_metadata = {
                         **metadata,
@@ -124,6 +129,8 @@ class ExcelProcessor(DocumentProcessor):
                         Document(page_content=combined_text, metadata=doc_metadata)
                     )
 
+                batch_start += len(batch_rows)
+
         wb.close()
         return documents
 
@@ -152,7 +159,7 @@ class LegacyExcelProcessor(DocumentProcessor):
         """
         settings = get_settings()
         rows_per_chunk = settings.excel_rows_per_chunk
-        key_fields = set(settings.excel_key_fields)
+        key_fields = settings.excel_key_fields_set
 
         workbook = xlrd.open_workbook(file_path)
         documents = []
@@ -190,36 +197,40 @@ class LegacyExcelProcessor(DocumentProcessor):
                 # If no key fields found, use all non-empty fields (fallback)
                 key_indices = [i for i, h in enumerate(headers) if h]
 
+            # Resolve (column, header) pairs once per sheet, not per cell
+            key_columns = [(i, headers[i]) for i in key_indices]
+
             # 批量处理数据行：每 N 行合并为一个 chunk
-            total_rows = sheet.nrows - 1  # Excluding header
             for batch_start in range(1, sheet.nrows, rows_per_chunk):
                 batch_end = min(batch_start + rows_per_chunk, sheet.nrows)
                 batch_texts = []
 
                 for row_idx in range(batch_start, batch_end):
+                    # Fetch whole row at once instead of one call per cell
+                    row_values = sheet.row_values(row_idx)
+                    row_types = sheet.row_types(row_idx)
+                    row_len = len(row_values)
                     row_data = []
 
                     # Only process key fields
-                    for col_idx in key_indices:
-                        if col_idx < sheet.ncols:
-                            header = headers[col_idx]
-                            cell_value = sheet.cell_value(row_idx, col_idx)
-
-                            if header and cell_value:
-                                # 处理日期类型
-                                if (
-                                    sheet.cell_type(row_idx, col_idx)
-                                    == xlrd.XL_CELL_DATE
-                                ):
-                                    date_tuple = xlrd.xldate_as_tuple(
-                                        cell_value, workbook.datemode
-                                    )
-                                    value_str = f"{date_tuple[0]}-{date_tuple[1]:02d}-{date_tuple[2]:02d}"
-                                else:
-                                    value_str = str(cell_value).strip()
-
-                                if value_str:
-                                    row_data.append(f"{header}: {value_str}")
+                    for col_idx, header in key_columns:
+                        if col_idx >= row_len:
+                            continue
+                        cell_value = row_values[col_idx]
+                        if not cell_value:
+                            continue
+
+                        # 处理日期类型
+                        if row_types[col_idx] == xlrd.XL_CELL_DATE:
+                            date_tuple = xlrd.xldate_as_tuple(
+                                cell_value, workbook.datemode
+                            )
+                            value_str = f"{date_tuple[0]}-{date_tuple[1]:02d}-{date_tuple[2]:02d}"
+                        else:
+                            value_str = str(cell_value).strip()
+
+                        if value_str:
+                            row_data.append(f"{header}: {value_str}")
 
                     if row_data:
                         batch_texts.append(